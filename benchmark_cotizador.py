@@ -0,0 +1,205 @@
+"""Benchmark del motor de cotización con los Excel que vienen en el repo.
+
+Uso:
+  python benchmark_cotizador.py                          # corre y muestra la tabla
+  python benchmark_cotizador.py --guardar base.json      # además guarda el resultado como línea base
+  python benchmark_cotizador.py --comparar base.json     # compara contra una línea base (exit 1 si empeora)
+
+Opciones: --consultas N (cotizaciones, 2000), --pdfs N (50), --cargas N (3), --semilla S,
+          --tolerancia T (0.25 = se acepta hasta 25% peor antes de marcar regresión).
+
+Mide por etapa p50/p95/p99 de latencia, throughput y pico de memoria (tracemalloc, en una pasada
+aparte para no inflar los tiempos). Las cotizaciones siguen una mezcla parecida a la real:
+mayoría LIMA / PARTICULAR / AUTOMOVIL y una cola larga de departamentos, usos y modelos raros.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from logica_cotizador import SoatQuotator, DEPARTAMENTOS
+from generador_pdf import crear_pdf, crear_pdf_cacheado, exportar_pdf_a_imagen, CacheDocumentos
+
+ARCHIVOS = ('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx')
+
+# Pesos aproximados de lo que llega por la web y el bot; lo que no figura entra con peso 1
+PESO_DEPARTAMENTO = {"LIMA": 120, "CALLAO": 12, "AREQUIPA": 10, "LA LIBERTAD": 8, "PIURA": 6, "LAMBAYEQUE": 6, "CUSCO": 5, "JUNIN": 4, "ICA": 3}
+PESO_USO = {"PARTICULAR": 70, "TAXI": 10, "CARGA": 7, "TRANSPORTE PERSONAL": 4, "URBANO": 3, "INTERPROVINCIAL": 2,
+            "COMERCIAL": 2, "AMBULANCIA": 1, "SERVICIO ESCOLAR": 1}
+CLASES = [  # (clase, peso, asientos posibles)
+    ("AUTOMOVIL", 45, [5]), ("SUV", 15, [5, 7]), ("PICK UP", 10, [2, 5]), ("SW", 5, [5]), ("VAN", 4, [8, 12, 15]),
+    ("MULTIPROPOSITO", 3, [7]), ("PANEL", 2, [2]), ("MOTOCICLETA", 6, [2]), ("TRIMOTO", 3, [3]), ("CAMION", 3, [2, 3]),
+    ("MICROBUS", 1, [16, 25, 33]), ("OMNIBUS", 1, [45, 60]), ("REMOLCADOR", 1, [2]), ("CUATRIMOTO", 1, [1]),
+]
+PROPORCION_MODELO_LIBRE = 0.05  # modelos escritos a mano que no están en el catálogo
+
+def generar_consultas(catalogo, n, semilla):
+    """Lista de tuplas (departamento, uso, clase, asientos, marca, modelo) con distribución sesgada."""
+    rnd = random.Random(semilla)
+    deptos = DEPARTAMENTOS
+    pesos_depto = [PESO_DEPARTAMENTO.get(d, 1) for d in deptos]
+    usos, pesos_uso = list(PESO_USO), list(PESO_USO.values())
+    pesos_clase = [c[1] for c in CLASES]
+
+    # Marcas y modelos con popularidad tipo Zipf (el orden de popularidad sale de la semilla)
+    marcas = list(catalogo)
+    rnd.shuffle(marcas)
+    pesos_marca = [1 / (i + 1) for i in range(len(marcas))]
+
+    consultas = []
+    for _ in range(n):
+        clase, _, asientos = rnd.choices(CLASES, pesos_clase)[0]
+        marca = rnd.choices(marcas, pesos_marca)[0] if marcas else "TOYOTA"
+        modelos = catalogo.get(marca, [])
+        if modelos and rnd.random() > PROPORCION_MODELO_LIBRE:
+            modelo = modelos[min(int(rnd.expovariate(0.5)), len(modelos) - 1)]
+        else:
+            modelo = f"MODELO {rnd.randint(1, 9999)}"
+        consultas.append((rnd.choices(deptos, pesos_depto)[0], rnd.choices(usos, pesos_uso)[0], clase,
+                          rnd.choice(asientos), marca, modelo))
+    return consultas
+
+def resumir(tiempos, total, memoria_pico):
+    ms = np.array(tiempos) * 1000
+    return {
+        "n": len(tiempos),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "por_segundo": round(len(tiempos) / total, 2) if total else 0.0,
+        "memoria_pico_mb": round(memoria_pico / 2**20, 2),
+    }
+
+def medir(fn, argumentos, repeticiones_memoria=20):
+    """Corre fn(*a) para cada a en argumentos tomando tiempos; luego mide el pico de memoria
+    con tracemalloc sobre las primeras `repeticiones_memoria` llamadas."""
+    tiempos = []
+    inicio = time.perf_counter()
+    for a in argumentos:
+        t = time.perf_counter()
+        fn(*a)
+        tiempos.append(time.perf_counter() - t)
+    total = time.perf_counter() - inicio
+
+    tracemalloc.start()
+    try:
+        for a in argumentos[:repeticiones_memoria]: fn(*a)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return resumir(tiempos, total, pico)
+
+def argumentos_pdf(motor, consultas, n):
+    """Cotiza n de las consultas y arma los parámetros de crear_pdf como los arma web_soat."""
+    lista = []
+    for i, (depto, uso, clase, asientos, marca, modelo) in enumerate(consultas[:n]):
+        df = motor.cotizar(depto, uso, clase, asientos, marca, modelo)
+        df_visible = df[df['Precio'] != "Consultar"]
+        campanas = ", ".join(df_visible[df_visible['Tiene_Campaña'] == True]['Aseguradora'].unique().tolist())
+        lista.append((f"2000-BENCH-{i}", "CLIENTE DE PRUEBA", "12345678", "987654321", "cliente@correo.com", "ABC123",
+                      marca, modelo, uso, clase, asientos, depto, "01/01/2027", df_visible, "", campanas))
+    return lista
+
+def correr(args):
+    etapas = {}
+    cargar = lambda m, ruta_snapshot=None: m.cargar_datos(*ARCHIVOS, ruta_snapshot=ruta_snapshot)
+
+    print("⏱️  cargar_datos (Excel)...")
+    etapas["cargar_datos_excel"] = medir(lambda: cargar(SoatQuotator()), [()] * args.cargas, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "tarifas.snapshot.pkl")
+        motor = SoatQuotator()
+        cargar(motor)
+        motor.guardar_snapshot(ruta)
+        print("⏱️  cargar_datos (snapshot)...")
+        etapas["cargar_datos_snapshot"] = medir(lambda: cargar(SoatQuotator(), ruta), [()] * args.cargas, 1)
+
+    print("⏱️  catálogo y clases...")
+    etapas["obtener_catalogo_vehiculos"] = medir(motor.obtener_catalogo_vehiculos, [()] * 20, 5)
+    etapas["obtener_clases_vehiculo"] = medir(motor.obtener_clases_vehiculo, [()] * 20, 5)
+
+    consultas = generar_consultas(motor.obtener_catalogo_vehiculos(), args.consultas, args.semilla)
+    print(f"⏱️  cotizar ({len(consultas)} consultas)...")
+    sin_cache = SoatQuotator(cache_max=0)
+    cargar(sin_cache)
+    etapas["cotizar_sin_cache"] = medir(sin_cache.cotizar, consultas)
+    con_cache = SoatQuotator()
+    cargar(con_cache)
+    etapas["cotizar_con_cache"] = medir(con_cache.cotizar, consultas)
+    etapas["cotizar_con_cache"]["cache_hits"] = con_cache.estadisticas_cache().get("hits")
+
+    print(f"⏱️  crear_pdf / exportar_pdf_a_imagen ({args.pdfs})...")
+    params = argumentos_pdf(motor, consultas, args.pdfs)
+    etapas["crear_pdf"] = medir(crear_pdf, params, 5)
+    pdfs = [(crear_pdf(*p),) for p in params]
+    # Sin cache: cada PDF se rasteriza de verdad
+    etapas["exportar_pdf_a_png"] = medir(lambda b: exportar_pdf_a_imagen(b, cache=None), pdfs, 5)
+    etapas["exportar_pdf_a_jpeg"] = medir(lambda b: exportar_pdf_a_imagen(b, 1.5, "jpeg", cache=None), pdfs, 5)
+    # Con cache: el mismo PDF pedido otra vez (lo que pasa en cada rerun de Streamlit)
+    cache = CacheDocumentos()
+    for p in params: crear_pdf_cacheado(*p, cache=cache)
+    etapas["crear_pdf_cacheado"] = medir(lambda *p: crear_pdf_cacheado(*p, cache=cache), params, 5)
+
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "maquina": platform.machine(),
+            "consultas": args.consultas,
+            "semilla": args.semilla,
+        },
+        "etapas": etapas,
+    }
+
+def imprimir(resultado):
+    print(f"\n{'etapa':<30}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}{'mem MB':>9}")
+    for nombre, e in resultado["etapas"].items():
+        print(f"{nombre:<30}{e['n']:>6}{e['p50_ms']:>10.2f}{e['p95_ms']:>10.2f}{e['p99_ms']:>10.2f}{e['por_segundo']:>10.1f}{e['memoria_pico_mb']:>9.2f}")
+
+def comparar(resultado, base, tolerancia):
+    """Imprime la variación contra la línea base y devuelve las etapas que empeoraron más que `tolerancia`."""
+    regresiones = []
+    print(f"\n{'etapa':<30}{'p50':>10}{'p95':>10}{'p99':>10}{'mem':>10}")
+    for nombre, e in resultado["etapas"].items():
+        b = base["etapas"].get(nombre)
+        if b is None:
+            print(f"{nombre:<30}{'(nueva)':>10}")
+            continue
+        variacion = {k: (e[k] - b[k]) / b[k] if b[k] else 0.0 for k in ("p50_ms", "p95_ms", "p99_ms", "memoria_pico_mb")}
+        print(f"{nombre:<30}" + "".join(f"{variacion[k]:>+10.0%}" for k in ("p50_ms", "p95_ms", "p99_ms", "memoria_pico_mb")))
+        if variacion["p95_ms"] > tolerancia or variacion["memoria_pico_mb"] > tolerancia:
+            regresiones.append(nombre)
+    return regresiones
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del motor de cotización SOAT")
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--pdfs", type=int, default=50)
+    parser.add_argument("--cargas", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=2026)
+    parser.add_argument("--guardar", help="guarda el resultado en este JSON")
+    parser.add_argument("--comparar", help="JSON de línea base contra el cual comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    resultado = correr(args)
+    imprimir(resultado)
+    if args.guardar:
+        with open(args.guardar, "w", encoding="utf-8") as f: json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Línea base guardada en {args.guardar}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f: base = json.load(f)
+        regresiones = comparar(resultado, base, args.tolerancia)
+        if regresiones:
+            print(f"\n❌ Empeoraron más de {args.tolerancia:.0%}: {', '.join(regresiones)}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones contra la línea base")
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""Clientes de Google Sheets y Zoho CRM que se crean una vez y se reutilizan.
+
+Antes cada cotización abría un cliente nuevo de gspread (autenticación + abrir la hoja) y pedía
+un access token nuevo a Zoho antes de crear el lead. Aquí:
+  - ClienteSheets guarda la hoja abierta hasta que falle (renovar=True la vuelve a abrir).
+  - ClienteZoho guarda el access token hasta que vence (expires_in) y, si el CRM responde 401,
+    lo renueva y reintenta una vez. Todo va por un requests.Session, que mantiene la conexión
+    abierta, así que crear un lead queda en un solo POST.
+
+Las URLs de Zoho se pueden cambiar (argumentos o variables ZOHO_URL_AUTH / ZOHO_URL_CRM), por
+ejemplo para apuntar a un servidor local de pruebas o al dominio .eu / .in de Zoho.
+"""
+import os
+import threading
+import time
+import requests
+
+URL_AUTH_ZOHO = os.environ.get("ZOHO_URL_AUTH", "https://accounts.zoho.com/oauth/v2/token")
+URL_CRM_ZOHO = os.environ.get("ZOHO_URL_CRM", "https://www.zohoapis.com/crm/v2/Leads")
+MARGEN_VENCIMIENTO = 60   # segundos antes del vencimiento en que ya se pide otro token
+
+class ErrorZoho(Exception):
+    def __init__(self, mensaje, respuesta=None):
+        super().__init__(mensaje)
+        self.respuesta = respuesta
+
+class ClienteSheets:
+    def __init__(self, credenciales, nombre_hoja="historial_soat", crear_cliente=None):
+        self.credenciales = credenciales
+        self.nombre_hoja = nombre_hoja
+        self.crear_cliente = crear_cliente
+        self._hoja = None
+        self._lock = threading.Lock()
+        self.conexiones = 0
+
+    def hoja(self, renovar=False):
+        """Devuelve la primera hoja de `nombre_hoja`, abriéndola solo la primera vez o si renovar=True."""
+        with self._lock:
+            if self._hoja is None or renovar:
+                crear = self.crear_cliente
+                if crear is None:
+                    import gspread
+                    crear = gspread.service_account_from_dict
+                self._hoja = crear(self.credenciales).open(self.nombre_hoja).sheet1
+                self.conexiones += 1
+            return self._hoja
+
+    def invalidar(self):
+        with self._lock: self._hoja = None
+
+class ClienteZoho:
+    def __init__(self, refresh_token, client_id, client_secret, url_auth=URL_AUTH_ZOHO, url_crm=URL_CRM_ZOHO,
+                 sesion=None, timeout=15):
+        self.refresh_token = refresh_token
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.url_auth = url_auth
+        self.url_crm = url_crm
+        self.sesion = sesion or requests.Session()
+        self.timeout = timeout
+        self._token = None
+        self._vence = 0.0
+        self._lock = threading.Lock()
+        self.renovaciones = 0
+
+    def access_token(self, renovar=False):
+        with self._lock:
+            if renovar or self._token is None or time.monotonic() >= self._vence:
+                datos = {"refresh_token": self.refresh_token, "client_id": self.client_id,
+                         "client_secret": self.client_secret, "grant_type": "refresh_token"}
+                res = self.sesion.post(self.url_auth, data=datos, timeout=self.timeout)
+                try: res_json = res.json()
+                except ValueError: res_json = {"error": res.text}
+                if not res_json.get("access_token"):
+                    self._token = None
+                    raise ErrorZoho(f"Auth failed: {res_json}", res_json)
+                self._token = res_json["access_token"]
+                self._vence = time.monotonic() + max(0, int(res_json.get("expires_in", 3600)) - MARGEN_VENCIMIENTO)
+                self.renovaciones += 1
+            return self._token
+
+    def invalidar(self):
+        with self._lock: self._token = None
+
+    def crear_lead(self, datos):
+        """Crea un lead en el CRM. Si el token fue revocado o venció antes de tiempo (401), pide otro
+        y reintenta una sola vez. Devuelve la respuesta; lanza ErrorZoho si el CRM no la acepta."""
+        payload = {"data": [datos]}
+        for intento in range(2):
+            headers = {"Authorization": f"Zoho-oauthtoken {self.access_token(renovar=intento > 0)}"}
+            res = self.sesion.post(self.url_crm, headers=headers, json=payload, timeout=self.timeout)
+            if res.status_code != 401: break
+        if res.status_code in [200, 201]: return res
+        raise ErrorZoho(f"CRM API error (Código {res.status_code}): {res.text}", res)
@@ -0,0 +1,18 @@
+"""Compila los tarifarios y campañas en un snapshot binario para que la API y Streamlit arranquen rápido.
+
+Uso: python compilar_snapshot.py [ruta_snapshot]
+
+Volver a correrlo después de editar cualquier Excel; mientras tanto el motor detecta que el
+snapshot está desactualizado (fecha y hash de los archivos) y vuelve a leer los Excel.
+"""
+import sys
+import time
+from logica_cotizador import SoatQuotator, RUTA_SNAPSHOT
+
+if __name__ == "__main__":
+    ruta = sys.argv[1] if len(sys.argv) > 1 else RUTA_SNAPSHOT
+    inicio = time.perf_counter()
+    motor = SoatQuotator()
+    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx')
+    hash_datos = motor.guardar_snapshot(ruta)
+    print(f"✅ Snapshot {ruta} generado en {time.perf_counter() - inicio:.2f}s (hash {hash_datos[:12]})")
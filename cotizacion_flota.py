@@ -0,0 +1,147 @@
+"""Cotización de flotas grandes desde CSV / Excel, por bloques y con salida incremental.
+
+Uso: python cotizacion_flota.py entrada.(csv|xlsx) salida.(csv|xlsx) [--bloque 500]
+
+La entrada necesita las columnas departamento, uso, clase, asientos, marca y modelo (placa y
+cualquier otra columna se copian tal cual a la salida). Se lee de a `bloque` filas, cada bloque
+se cotiza con SoatQuotator.cotizar_lote (los vehículos repetidos se cotizan una sola vez y el cache
+del motor se comparte entre bloques) y se escribe apenas está listo, con una columna de precio por
+aseguradora más la mejor opción. La memoria no depende del tamaño del archivo.
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from logica_cotizador import SoatQuotator, ASEGURADORAS, COLUMNAS_VEHICULO, RUTA_SNAPSHOT
+
+TAMANO_BLOQUE = 500
+
+def _es_excel(nombre):
+    return str(nombre).lower().endswith(('.xlsx', '.xlsm'))
+
+def _limpiar_columnas(df):
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    faltantes = [c for c in COLUMNAS_VEHICULO if c not in df.columns]
+    if faltantes: raise ValueError(f"Faltan columnas en el archivo: {', '.join(faltantes)}")
+    return df
+
+def leer_en_bloques(origen, tamano=TAMANO_BLOQUE, nombre=None):
+    """Genera DataFrames de `tamano` filas desde una ruta o un archivo abierto (CSV o XLSX).
+    `nombre` indica el formato cuando origen es un archivo sin ruta (ej. lo que sube Streamlit)."""
+    nombre = nombre or getattr(origen, 'name', origen)
+    if not _es_excel(nombre):
+        for bloque in pd.read_csv(origen, dtype=str, keep_default_na=False, chunksize=tamano):
+            yield _limpiar_columnas(bloque)
+        return
+
+    libro = load_workbook(origen, read_only=True, data_only=True)
+    try:
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None: return
+        columnas = ["" if c is None else str(c) for c in encabezado]
+        pendientes = []
+        for fila in filas:
+            if all(v is None for v in fila): continue
+            pendientes.append(["" if v is None else v for v in fila])
+            if len(pendientes) == tamano:
+                yield _limpiar_columnas(pd.DataFrame(pendientes, columns=columnas))
+                pendientes = []
+        if pendientes: yield _limpiar_columnas(pd.DataFrame(pendientes, columns=columnas))
+    finally:
+        libro.close()
+
+def validar_asientos(columna):
+    """Devuelve (asientos numéricos, máscara de filas válidas): solo cuentan los enteros finitos
+    ("5.5", "inf" o texto quedan fuera en vez de truncarse o reventar en astype(int))."""
+    asientos = pd.to_numeric(columna, errors='coerce')
+    validos = np.isfinite(asientos) & (asientos % 1 == 0)
+    return asientos, validos
+
+def cotizar_bloque(motor, bloque):
+    """Devuelve el bloque con una columna 'Precio <aseguradora>' por aseguradora, la mejor opción
+    y una columna Error para las filas que no se pudieron cotizar."""
+    bloque = bloque.reset_index(drop=True)
+    asientos, validos = validar_asientos(bloque['asientos'])
+
+    columnas_precio = [f"Precio {a}" for a in ASEGURADORAS]
+    salida = pd.DataFrame("", index=bloque.index, columns=columnas_precio + ["Mejor Aseguradora", "Mejor Precio", "Error"], dtype=object)
+    salida.loc[~validos, "Error"] = "asientos inválidos"
+    salida = pd.concat([bloque, salida], axis=1)
+    if not validos.any(): return salida
+
+    lote = bloque[validos].assign(asientos=asientos[validos].astype(int))
+    res = motor.cotizar_lote(lote)
+    if res.empty: return salida
+    res['Vehiculo'] = lote.index[res['Vehiculo']]
+    precios = res.pivot(index='Vehiculo', columns='Aseguradora', values='Precio')
+    for aseguradora, col in zip(ASEGURADORAS, columnas_precio):
+        if aseguradora in precios.columns: salida.loc[precios.index, col] = precios[aseguradora].fillna("").astype(object)
+
+    numericos = precios.apply(pd.to_numeric, errors='coerce')
+    con_precio = numericos.notna().any(axis=1)
+    if con_precio.any():
+        mejores = numericos[con_precio]
+        salida.loc[mejores.index, "Mejor Aseguradora"] = mejores.idxmin(axis=1)
+        salida.loc[mejores.index, "Mejor Precio"] = mejores.min(axis=1)
+    return salida
+
+def cotizar_flota(motor, bloques):
+    """Cotiza bloque por bloque (generador): cada resultado se puede escribir antes de leer el siguiente."""
+    for bloque in bloques:
+        yield cotizar_bloque(motor, bloque)
+
+def escribir_csv(resultados, destino):
+    """Escribe los bloques en CSV a medida que llegan. destino: ruta o archivo de texto abierto."""
+    propio = isinstance(destino, (str, os.PathLike))
+    f = open(destino, 'w', newline='', encoding='utf-8-sig') if propio else destino
+    total = 0
+    try:
+        for i, bloque in enumerate(resultados):
+            bloque.to_csv(f, index=False, header=(i == 0))
+            f.flush()
+            total += len(bloque)
+    finally:
+        if propio: f.close()
+    return total
+
+def escribir_xlsx(resultados, destino):
+    """Escribe los bloques en un Excel en modo write_only (las filas no quedan en memoria).
+    destino: ruta o archivo binario abierto."""
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("COTIZACION FLOTA")
+    total = 0
+    for i, bloque in enumerate(resultados):
+        if i == 0: hoja.append(list(bloque.columns))
+        for fila in bloque.itertuples(index=False):
+            hoja.append([None if isinstance(v, float) and pd.isna(v) else v for v in fila])
+        total += len(bloque)
+    libro.save(destino)
+    return total
+
+def escribir(resultados, destino, nombre=None):
+    """Elige CSV o XLSX según la extensión de `nombre` (o de destino si es una ruta)."""
+    return escribir_xlsx(resultados, destino) if _es_excel(nombre or destino) else escribir_csv(resultados, destino)
+
+def cotizar_archivo(motor, entrada, salida, tamano=TAMANO_BLOQUE):
+    return escribir(cotizar_flota(motor, leer_en_bloques(entrada, tamano)), salida)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cotiza una flota desde CSV/XLSX")
+    parser.add_argument("entrada")
+    parser.add_argument("salida")
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE)
+    args = parser.parse_args()
+
+    motor = SoatQuotator()
+    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx', ruta_snapshot=RUTA_SNAPSHOT)
+    inicio = time.perf_counter()
+    try:
+        total = cotizar_archivo(motor, args.entrada, args.salida, args.bloque)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"✅ {total} vehículos cotizados en {time.perf_counter() - inicio:.1f}s -> {args.salida}")
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""Documentos de cotización para flotas: un PDF por vehículo empaquetado en ZIP y/o un solo PDF
+con una tabla resumen al inicio y una página por vehículo.
+
+Uso: python documentos_flota.py entrada.(csv|xlsx) salida.zip [--consolidado flota.pdf]
+         [--cliente NOMBRE] [--dni DNI] [--celular N] [--email CORREO] [--procesos N] [--bloque 500]
+
+La entrada es la misma de cotizacion_flota.py (departamento, uso, clase, asientos, marca, modelo y
+opcionalmente placa y vencimiento). Los vehículos se cotizan por bloques con cotizar_lote y los
+PDF se arman en un pool de procesos (uno por núcleo); el ZIP se escribe a medida que llegan, así
+que la memoria no depende del tamaño de la flota. El PDF consolidado se arma en un solo documento
+para que todas las páginas compartan el logo.
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+from logica_cotizador import SoatQuotator, RUTA_SNAPSHOT
+from cotizacion_flota import leer_en_bloques, validar_asientos, TAMANO_BLOQUE
+from generador_pdf import crear_pdf, nuevo_pdf, dibujar_cotizacion, precargar_logo, AZUL, NEGRO
+
+TAREAS_POR_PROCESO = 8   # PDFs que se mandan juntos a cada proceso (menos idas y vueltas)
+
+def cotizaciones_de_flota(motor, bloques, cliente="", dni_ruc="", celular="", email="", prefijo=None):
+    """Genera, en el orden del archivo, los argumentos de crear_pdf de cada vehículo con precios.
+    Los vehículos con asientos inválidos o sin ninguna oferta se saltan."""
+    prefijo = prefijo or f"2000-{datetime.now().strftime('%m%d-%H%M')}"
+    numero = 0
+    for bloque in bloques:
+        bloque = bloque.reset_index(drop=True)
+        asientos, enteros = validar_asientos(bloque['asientos'])
+        validos = bloque[enteros].assign(asientos=asientos[enteros].astype(int)).reset_index(drop=True)
+        if validos.empty: continue
+        res = motor.cotizar_lote(validos)
+        if res.empty: continue
+        res = res[res['Precio'] != "Consultar"]
+        por_vehiculo = {i: df.drop(columns=['Vehiculo', 'Placa'], errors='ignore').reset_index(drop=True) for i, df in res.groupby('Vehiculo', sort=False)}
+        for i, fila in enumerate(validos.to_dict('records')):
+            df_visible = por_vehiculo.get(i)
+            if df_visible is None: continue
+            numero += 1
+            campanas = df_visible[df_visible['Tiene_Campaña'] == True]['Aseguradora'].unique().tolist()
+            yield {
+                "cotizacion_nro": f"{prefijo}-{numero:04d}", "cliente": cliente, "dni_ruc": dni_ruc, "celular": celular,
+                "email": email, "placa": fila.get('placa', ""), "marca": fila['marca'], "modelo": fila['modelo'],
+                "uso": fila['uso'], "clase": fila['clase'], "asientos": fila['asientos'], "region": fila['departamento'],
+                "fecha_vencimiento": fila.get('vencimiento', ""), "df_resultados": df_visible,
+                "campanas_activas_txt": ", ".join(campanas),
+            }
+
+def nombre_documento(cotizacion):
+    placa = re.sub(r'[^\w-]', '', str(cotizacion['placa'])) or "SIN_PLACA"
+    return f"{cotizacion['cotizacion_nro']}_{placa}.pdf"
+
+def _crear_pdfs(cotizaciones):
+    return [crear_pdf(**c) for c in cotizaciones]
+
+def _en_tareas(cotizaciones, tamano):
+    tarea = []
+    for c in cotizaciones:
+        tarea.append(c)
+        if len(tarea) == tamano:
+            yield tarea
+            tarea = []
+    if tarea: yield tarea
+
+def generar_pdfs(cotizaciones, procesos=None, tamano_tarea=TAREAS_POR_PROCESO):
+    """Genera (cotizacion, pdf_bytes) en el mismo orden de entrada usando `procesos` procesos
+    (por defecto uno por núcleo; 1 = en este mismo proceso). Solo hay unas pocas tareas en vuelo a
+    la vez, así que se puede consumir una flota de cualquier tamaño."""
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        for c in cotizaciones: yield c, crear_pdf(**c)
+        return
+    # forkserver y no fork: este proceso puede tener hilos (uvicorn, Streamlit, el vigilante de
+    # tarifas) con locks tomados que quedarían tomados para siempre en el hijo. Cada proceso
+    # decodifica el logo una sola vez al arrancar
+    contexto = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=precargar_logo) as ejecutor:
+        en_vuelo = deque()
+        for tarea in _en_tareas(cotizaciones, tamano_tarea):
+            en_vuelo.append((tarea, ejecutor.submit(_crear_pdfs, tarea)))
+            if len(en_vuelo) >= procesos * 2:
+                tarea, futuro = en_vuelo.popleft()
+                yield from zip(tarea, futuro.result())
+        while en_vuelo:
+            tarea, futuro = en_vuelo.popleft()
+            yield from zip(tarea, futuro.result())
+
+def escribir_zip(documentos, destino):
+    """Escribe (cotizacion, pdf_bytes) en un ZIP a medida que llegan. destino: ruta o archivo binario
+    (puede ser un stream sin seek, como una respuesta HTTP). Devuelve la cantidad de PDFs."""
+    total = 0
+    # Los PDF ya vienen comprimidos por dentro: guardarlos sin volver a comprimir
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_STORED) as zf:
+        for cotizacion, pdf_bytes in documentos:
+            zf.writestr(nombre_documento(cotizacion), pdf_bytes)
+            total += 1
+    return total
+
+def _mejor_oferta(df_resultados):
+    precios = pd.to_numeric(df_resultados['Precio'], errors='coerce')
+    if precios.notna().any():
+        i = precios.idxmin()
+        return df_resultados.at[i, 'Aseguradora'], float(precios[i])
+    return "-", None
+
+def _dibujar_resumen(pdf, filas, cliente):
+    """Páginas con la tabla resumen (una fila por vehículo) y el total de las mejores ofertas."""
+    columnas = [("#", 10), ("PLACA", 25), ("VEHÍCULO", 60), ("USO", 35), ("MEJOR OPCIÓN", 35), ("PRECIO", 25)]
+
+    def encabezado_tabla():
+        pdf.set_font('Arial', 'B', 8); pdf.set_fill_color(240, 240, 240); pdf.set_text_color(*NEGRO)
+        for titulo, ancho in columnas: pdf.cell(ancho, 7, titulo, 1, 0, 'C', fill=True)
+        pdf.ln(7)
+
+    pdf.add_page()
+    pdf.section_title(f"RESUMEN DE FLOTA - {cliente}" if cliente else "RESUMEN DE FLOTA")
+    encabezado_tabla()
+    total = 0.0
+    for n, (placa, vehiculo, uso, aseguradora, precio) in enumerate(filas, 1):
+        if pdf.get_y() > 275:
+            pdf.add_page()
+            encabezado_tabla()
+        pdf.set_font('Arial', '', 8); pdf.set_text_color(*NEGRO)
+        valores = [str(n), str(placa), vehiculo[:38], str(uso)[:20], str(aseguradora), f"S/ {precio:.2f}" if precio is not None else "-"]
+        for (_, ancho), valor in zip(columnas, valores): pdf.cell(ancho, 6, valor, "B", 0, 'C')
+        pdf.ln(6)
+        if precio is not None: total += precio
+    pdf.ln(3)
+    pdf.set_font('Arial', 'B', 10); pdf.set_text_color(*AZUL)
+    pdf.cell(0, 6, f"{len(filas)} vehículos - Total mejores ofertas: S/ {total:,.2f} (incluye IGV)", 0, 1, 'R')
+
+def _mover_al_inicio(pdf, desde):
+    """Pasa las páginas desde..última al principio del documento (fpdf 1.7 guarda las páginas y sus
+    links en diccionarios por número de página)."""
+    ultima = pdf.page
+    orden = list(range(desde, ultima + 1)) + list(range(1, desde))
+    pdf.pages = {nuevo: pdf.pages[viejo] for nuevo, viejo in enumerate(orden, 1)}
+    pdf.page_links = {nuevo: pdf.page_links[viejo] for nuevo, viejo in enumerate(orden, 1) if viejo in pdf.page_links}
+
+def crear_pdf_consolidado(cotizaciones, cliente=""):
+    """Un solo PDF: tabla resumen al inicio y después una página por vehículo (la misma de crear_pdf).
+    Las páginas de vehículos se dibujan primero mientras se arma el resumen, y al final el resumen se
+    mueve adelante; así no hace falta tener todas las cotizaciones en memoria."""
+    pdf = nuevo_pdf()
+    filas = []
+    for c in cotizaciones:
+        dibujar_cotizacion(pdf, **c)
+        filas.append((c['placa'], f"{c['marca']} {c['modelo']}", c['uso'], *_mejor_oferta(c['df_resultados'])))
+    paginas_vehiculos = pdf.page
+    _dibujar_resumen(pdf, filas, cliente)
+    _mover_al_inicio(pdf, paginas_vehiculos + 1)
+    return pdf.output(dest='S').encode('latin-1')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PDFs de cotización para una flota desde CSV/XLSX")
+    parser.add_argument("entrada")
+    parser.add_argument("salida", help="ZIP con un PDF por vehículo")
+    parser.add_argument("--consolidado", help="además, un solo PDF con resumen y una página por vehículo")
+    parser.add_argument("--cliente", default="")
+    parser.add_argument("--dni", default="")
+    parser.add_argument("--celular", default="")
+    parser.add_argument("--email", default="")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--bloque", type=int, default=TAMANO_BLOQUE)
+    args = parser.parse_args()
+
+    motor = SoatQuotator()
+    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx', ruta_snapshot=RUTA_SNAPSHOT)
+    datos_cliente = dict(cliente=args.cliente, dni_ruc=args.dni, celular=args.celular, email=args.email)
+    try:
+        inicio = time.perf_counter()
+        cotizaciones = cotizaciones_de_flota(motor, leer_en_bloques(args.entrada, args.bloque), **datos_cliente)
+        total = escribir_zip(generar_pdfs(cotizaciones, args.procesos), args.salida)
+        duracion = time.perf_counter() - inicio
+        print(f"✅ {total} PDFs en {duracion:.1f}s ({total / duracion if duracion else 0:.1f} documentos/s) -> {args.salida}")
+        if args.consolidado:
+            inicio = time.perf_counter()
+            cotizaciones = cotizaciones_de_flota(motor, leer_en_bloques(args.entrada, args.bloque), **datos_cliente)
+            with open(args.consolidado, "wb") as f: f.write(crear_pdf_consolidado(cotizaciones, args.cliente))
+            print(f"✅ PDF consolidado en {time.perf_counter() - inicio:.1f}s -> {args.consolidado}")
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
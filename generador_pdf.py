@@ -1,26 +1,104 @@
 from fpdf import FPDF
 from datetime import datetime
+from collections import OrderedDict
+import hashlib
 import os
+import threading
 import fitz # Esta es la librería PyMuPDF
 import io
+import pandas as pd
 
-def exportar_pdf_a_png(pdf_bytes):
+# Formato -> tipo MIME (los que PyMuPDF escribe por sí solo, sin Pillow)
+FORMATOS_IMAGEN = {"png": "image/png", "jpeg": "image/jpeg"}
+
+class CacheDocumentos:
+    """Cache LRU (limitado por bytes) de PDFs e imágenes ya generados.
+
+    La clave es un hash del contenido (datos de la cotización u opciones + bytes del PDF), así
+    que mientras la cotización no cambie, volver a pedir el documento no cuesta nada.
     """
-    Toma los bytes de un PDF y devuelve los bytes de una imagen PNG usando PyMuPDF.
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()   # clave -> bytes
+        self._tamano = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            datos = self._datos.get(clave)
+            if datos is None:
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return datos
+
+    def guardar(self, clave, datos):
+        if datos is None or len(datos) > self.max_bytes: return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None: self._tamano -= len(anterior)
+            self._datos[clave] = datos
+            self._tamano += len(datos)
+            while self._tamano > self.max_bytes:
+                _, viejo = self._datos.popitem(last=False)
+                self._tamano -= len(viejo)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._tamano = 0
+
+    def estadisticas(self):
+        with self._lock:
+            return {"documentos": len(self._datos), "bytes": self._tamano, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+CACHE_DOCUMENTOS = CacheDocumentos()
+
+def huella(*partes):
+    """Hash estable de los datos de un documento (los DataFrames se hashean por contenido)."""
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, pd.DataFrame):
+            h.update(repr(parte.to_dict('split', index=False)).encode())
+        elif isinstance(parte, (bytes, bytearray)):
+            h.update(parte)
+        else:
+            h.update(repr(parte).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def exportar_pdf_a_imagen(pdf_bytes, zoom=2, formato="png", calidad=85, cache=CACHE_DOCUMENTOS):
     """
+    Toma los bytes de un PDF y devuelve la primera página como imagen (png o jpeg) usando
+    PyMuPDF. zoom=2 es la resolución de siempre (144 dpi); calidad solo aplica a jpeg.
+    """
+    formato = formato.lower().replace("jpg", "jpeg")
+    if formato not in FORMATOS_IMAGEN: raise ValueError(f"Formato de imagen no soportado: {formato}")
+    clave = huella("imagen", zoom, formato, calidad, pdf_bytes) if cache is not None else None
+    if clave is not None:
+        imagen = cache.obtener(clave)
+        if imagen is not None: return imagen
     try:
-        # Abrir el documento desde la memoria RAM
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        # Seleccionar la primera página
-        pagina = doc.load_page(0)
-        # Convertir a imagen con un poco de zoom para que se vea en alta calidad (matrix)
-        mat = fitz.Matrix(2, 2)
-        pix = pagina.get_pixmap(matrix=mat)
-        # Devolver los bytes de la imagen
-        return pix.tobytes("png")
+        # Abrir el documento desde la memoria RAM y convertir la primera página con el zoom pedido
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            pix = doc.load_page(0).get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        if formato == "png": imagen = pix.tobytes("png")
+        else: imagen = pix.tobytes("jpeg", jpg_quality=calidad)
     except Exception as e:
-        print(f"Error crítico en conversión a PNG: {e}")
+        print(f"Error crítico en conversión a {formato.upper()}: {e}")
         return None
+    if clave is not None: cache.guardar(clave, imagen)
+    return imagen
+
+def exportar_pdf_a_png(pdf_bytes):
+    """
+    Toma los bytes de un PDF y devuelve los bytes de una imagen PNG usando PyMuPDF.
+    """
+    return exportar_pdf_a_imagen(pdf_bytes)
 
 
 # COLORES CORPORATIVOS (AZUL ELECTRICO)
@@ -31,7 +109,29 @@ ROJO = (220, 50, 50)
 GRIS = (120, 120, 120)
 VERDE_WA = (37, 211, 102)
 
+COBERTURAS = (
+    ("GASTOS MEDICOS", "S/ 27,500 (5 UIT)", "Atención médica, hospitalaria y quirúrgica."),
+    ("MUERTE / INVALIDEZ", "S/ 22,000 (4 UIT)", "Indemnización inmediata a beneficiarios."),
+    ("INCAPACIDAD", "S/ 5,500 (1 UIT)", "Pago diario por descanso médico temporal."),
+    ("SEPELIO", "S/ 5,500 (1 UIT)", "Reembolso de gastos de funeral.")
+)
+
+# Imágenes ya decodificadas por fpdf: (ruta, fecha de modificación) -> info
+_IMAGENES = {}
+
 class PDF(FPDF):
+    def _parsepng(self, name):
+        # Decodificar el PNG (separar el canal alfa y recomprimir) es casi todo el costo de un PDF;
+        # se hace una vez por archivo y cada documento recibe una copia (fpdf le agrega 'i'/'n' y al
+        # final borra 'data'/'smask' de su copia)
+        # _parsepng es interno de fpdf: por eso requirements.txt fija fpdf==1.7.2
+        clave = (name, os.path.getmtime(name))
+        if clave not in _IMAGENES: _IMAGENES[clave] = FPDF._parsepng(self, name)
+        info = _IMAGENES[clave]
+        # fpdf sube el documento a PDF 1.4 cuando el PNG trae transparencia
+        if 'smask' in info: self.pdf_version = '1.4'
+        return dict(info)
+
     def header(self):
         if os.path.exists("logo.png"): self.image("logo.png", 10, 10, 35)
         self.set_xy(50, 20)
@@ -48,14 +148,25 @@ class PDF(FPDF):
         self.ln(3)
 
 
-# AÑADIDO PARAMETRO dni_ruc
-def crear_pdf(cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, modelo, uso, clase, asientos, region, fecha_vencimiento, df_resultados, observaciones_especiales="", campanas_activas_txt=""):
-  
+def precargar_logo():
+    """Decodifica logo.png una vez (útil antes de hacer fork de procesos que van a crear PDFs)."""
+    if os.path.exists("logo.png"): PDF()._parsepng("logo.png")
+
+def nuevo_pdf():
     # En la clase PDF o donde haces pdf = PDF()
     pdf = PDF(orientation='P', unit='mm', format='A4')
     pdf.set_margins(10, 10, 10) # Márgenes estrechos (10mm en lugar de los usuales 20mm)
     pdf.set_auto_page_break(False) # Desactiva el salto automático para controlar mejor el final
+    return pdf
 
+# AÑADIDO PARAMETRO dni_ruc
+def crear_pdf(cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, modelo, uso, clase, asientos, region, fecha_vencimiento, df_resultados, observaciones_especiales="", campanas_activas_txt=""):
+    pdf = nuevo_pdf()
+    dibujar_cotizacion(pdf, cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, modelo, uso, clase, asientos, region, fecha_vencimiento, df_resultados, observaciones_especiales, campanas_activas_txt)
+    return pdf.output(dest='S').encode('latin-1')
+
+def dibujar_cotizacion(pdf, cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, modelo, uso, clase, asientos, region, fecha_vencimiento, df_resultados, observaciones_especiales="", campanas_activas_txt=""):
+    """Agrega una página con la cotización de un vehículo (lo usan crear_pdf y los documentos de flota)."""
     pdf.add_page()
 
     # --- 1. RESUMEN ---
@@ -108,7 +219,7 @@ def crear_pdf(cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, mo
     pdf.cell(50, 10, "PRECIO", 1, 0, 'C', fill=True)
     pdf.cell(90, 10, "SOLICITUD", 1, 1, 'C', fill=True)
     
-    for _, row in df_resultados.iterrows():
+    for row in df_resultados.to_dict('records'):
         h_row = 12
         x_start = pdf.get_x(); y_start = pdf.get_y()
         
@@ -159,16 +270,10 @@ def crear_pdf(cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, mo
     # --- 3. COBERTURAS ---
     pdf.ln(5)
     pdf.section_title("COBERTURAS")
-    coberturas = [
-        ("GASTOS MEDICOS", "S/ 27,500 (5 UIT)", "Atención médica, hospitalaria y quirúrgica."),
-        ("MUERTE / INVALIDEZ", "S/ 22,000 (4 UIT)", "Indemnización inmediata a beneficiarios."),
-        ("INCAPACIDAD", "S/ 5,500 (1 UIT)", "Pago diario por descanso médico temporal."),
-        ("SEPELIO", "S/ 5,500 (1 UIT)", "Reembolso de gastos de funeral.")
-    ]
     pdf.set_font('Arial', 'B', 8); pdf.set_text_color(100,100,100)
     pdf.cell(50, 6, "BENEFICIO", "B", 0, 'L'); pdf.cell(40, 6, "MONTO", "B", 0, 'L'); pdf.cell(0, 6, "DETALLE", "B", 1, 'L')
     
-    for t, m, d in coberturas:
+    for t, m, d in COBERTURAS:
         pdf.set_font('Arial', 'B', 9); pdf.set_text_color(*AZUL)
         pdf.cell(50, 6, t, "B", 0, 'L')
         pdf.set_font('Arial', 'B', 9); pdf.set_text_color(0, 100, 0)
@@ -190,4 +295,17 @@ def crear_pdf(cotizacion_nro, cliente, dni_ruc, celular, email, placa, marca, mo
         pdf.set_text_color(*AZUL)
         pdf.cell(0, 4, f"Campaña con: {campanas_activas_txt}", 0, 1, 'L')
 
-    return pdf.output(dest='S').encode('latin-1')
+def _clave_documento(tipo, args, kwargs):
+    # El PDF lleva la fecha de cotización, así que también forma parte de la clave
+    nombres = sorted(kwargs)
+    return huella(tipo, datetime.now().strftime('%d/%m/%Y'), len(args), *args, nombres, *(kwargs[n] for n in nombres))
+
+def crear_pdf_cacheado(*args, cache=CACHE_DOCUMENTOS, **kwargs):
+    """crear_pdf con cache por contenido: la misma cotización (mismos datos, mismo día, porque el
+    PDF lleva la fecha) devuelve los mismos bytes sin volver a armar el documento."""
+    clave = _clave_documento("pdf", args, kwargs)
+    pdf_bytes = cache.obtener(clave)
+    if pdf_bytes is None:
+        pdf_bytes = crear_pdf(*args, **kwargs)
+        cache.guardar(clave, pdf_bytes)
+    return pdf_bytes
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""Historial de cotizaciones escrito en segundo plano (SQLite local + Google Sheets).
+
+La cotización solo anota la fila en un spool local (historial_pendiente.jsonl) y avisa por una
+cola; un hilo la escribe después por lotes: a la base local en una sola transacción y a Sheets
+con un solo append_rows. Si Sheets falla se reintenta con espera exponencial sin frenar a nadie. Cada fila
+confirmada se marca en el spool, así que si el proceso se reinicia lo pendiente se vuelve a
+enviar al arrancar.
+
+La hoja se obtiene con `obtener_hoja()` (cualquier objeto con append_rows); para pruebas o para
+correr sin credenciales sirve HojaEnMemoria.
+
+La base local (AlmacenHistorial, historial_cotizaciones.db) guarda cada cotización y además un
+resumen por día / rol / uso / departamento / aseguradora más barata / campaña que se actualiza en
+la misma transacción. Las consultas del panel de administración leen solo el resumen, así que
+tardan milisegundos aunque haya millones de cotizaciones. El CSV se exporta por partes, sin cargar
+la tabla en memoria.
+"""
+import csv
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict
+import pandas as pd
+
+COLUMNAS_HISTORIAL = ["Fecha", "Hora", "ID", "Rol", "Cliente", "DNI_RUC", "Celular", "Email", "Placa", "Marca", "Modelo",
+                      "Uso", "Precio_Ref", "Cia_Min", "Precio_Min", "Es_Campaña", "Departamento"]
+# La hoja de Google conserva sus 16 columnas de siempre; el departamento solo va a la base local
+COLUMNAS_SHEETS = COLUMNAS_HISTORIAL[:16]
+CAMPOS_BD = ["fecha", "hora", "id", "rol", "cliente", "dni_ruc", "celular", "email", "placa", "marca", "modelo",
+             "uso", "precio_ref", "cia_min", "precio_min", "es_campana", "departamento"]
+SEGMENTOS = ("rol", "uso", "departamento", "cia_min")
+# Cotizaciones donde alguna aseguradora dio precio (sin oferta se registra cia_min "-")
+CON_ASEGURADORA = "cia_min NOT IN ('', '-')"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS cotizaciones (
+    fecha TEXT, hora TEXT, id TEXT, rol TEXT, cliente TEXT, dni_ruc TEXT, celular TEXT, email TEXT, placa TEXT,
+    marca TEXT, modelo TEXT, uso TEXT, precio_ref REAL, cia_min TEXT, precio_min REAL, es_campana TEXT, departamento TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_cotizaciones_fecha ON cotizaciones (fecha);
+CREATE INDEX IF NOT EXISTS ix_cotizaciones_placa ON cotizaciones (placa);
+CREATE TABLE IF NOT EXISTS resumen (
+    fecha TEXT, rol TEXT, uso TEXT, departamento TEXT, cia_min TEXT, es_campana TEXT,
+    cantidad INTEGER NOT NULL, con_precio INTEGER NOT NULL, suma_precio REAL NOT NULL,
+    PRIMARY KEY (fecha, rol, uso, departamento, cia_min, es_campana)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+def _precio(valor):
+    try: return float(valor)
+    except (TypeError, ValueError): return None
+
+class AlmacenHistorial:
+    """Historial local en SQLite. Cada operación abre su propia conexión (modo WAL), así que se
+    puede usar desde el hilo escritor y desde los hilos de Streamlit a la vez."""
+    def __init__(self, ruta="historial_cotizaciones.db", ruta_csv_anterior="historial_cotizaciones.csv"):
+        self.ruta = ruta
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(ESQUEMA)
+            importado = con.execute("SELECT valor FROM meta WHERE clave = 'csv_importado'").fetchone()
+        if not importado and ruta_csv_anterior and os.path.exists(ruta_csv_anterior): self.importar_csv(ruta_csv_anterior)
+
+    def _conectar(self):
+        con = sqlite3.connect(self.ruta, timeout=30)
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def agregar(self, filas):
+        """Inserta filas (listas en el orden de COLUMNAS_HISTORIAL) y actualiza el resumen, todo en
+        una transacción. Las filas viejas sin departamento se completan con ""."""
+        registros, resumen = [], defaultdict(lambda: [0, 0, 0.0])
+        for fila in filas:
+            fila = ["" if v is None else v for v in list(fila)[:len(CAMPOS_BD)]]
+            fila += [""] * (len(CAMPOS_BD) - len(fila))
+            for i in (12, 14):   # Precio_Ref y Precio_Min como número cuando se puede
+                if _precio(fila[i]) is not None: fila[i] = _precio(fila[i])
+            precio = _precio(fila[14])
+            registros.append(fila)
+            clave = (str(fila[0]), str(fila[3]), str(fila[11]), str(fila[16]), str(fila[13]), str(fila[15]))
+            acumulado = resumen[clave]
+            acumulado[0] += 1
+            if precio: acumulado[1] += 1; acumulado[2] += precio
+        if not registros: return 0
+        with self._conectar() as con:
+            con.executemany(f"INSERT INTO cotizaciones VALUES ({', '.join('?' * len(CAMPOS_BD))})", registros)
+            con.executemany("""INSERT INTO resumen VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT DO UPDATE SET cantidad = cantidad + excluded.cantidad,
+                                   con_precio = con_precio + excluded.con_precio, suma_precio = suma_precio + excluded.suma_precio""",
+                            [(*clave, *valores) for clave, valores in resumen.items()])
+        return len(registros)
+
+    def importar_csv(self, ruta_csv, tamano=5000):
+        """Pasa a la base el CSV que se usaba antes (una sola vez; queda marcado en meta)."""
+        total = 0
+        with open(ruta_csv, newline="", encoding="utf-8-sig") as f:
+            lector = csv.reader(f)
+            next(lector, None)
+            lote = []
+            for fila in lector:
+                lote.append(fila)
+                if len(lote) == tamano: total += self.agregar(lote); lote = []
+            total += self.agregar(lote)
+        with self._conectar() as con: con.execute("INSERT OR REPLACE INTO meta VALUES ('csv_importado', ?)", (ruta_csv,))
+        print(f"📝 Historial: {total} cotizaciones importadas de {ruta_csv}")
+        return total
+
+    def _consultar(self, sql, parametros=()):
+        with self._conectar() as con:
+            cursor = con.execute(sql, parametros)
+            return pd.DataFrame(cursor.fetchall(), columns=[c[0] for c in cursor.description])
+
+    @staticmethod
+    def _rango(desde, hasta, *otras):
+        condiciones, parametros = list(otras), []
+        if desde: condiciones.append("fecha >= ?"); parametros.append(str(desde))
+        if hasta: condiciones.append("fecha <= ?"); parametros.append(str(hasta))
+        return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), parametros
+
+    def total(self):
+        with self._conectar() as con: return con.execute("SELECT COALESCE(SUM(cantidad), 0) FROM resumen").fetchone()[0]
+
+    def cotizaciones_por_dia(self, desde=None, hasta=None):
+        donde, parametros = self._rango(desde, hasta)
+        return self._consultar(f"""SELECT fecha, SUM(cantidad) AS cotizaciones, SUM(CASE WHEN rol = 'CLIENTE' THEN cantidad ELSE 0 END) AS de_clientes
+                                   FROM resumen{donde} GROUP BY fecha ORDER BY fecha""", parametros)
+
+    def participacion_mas_barata(self, desde=None, hasta=None):
+        """Cuántas veces cada aseguradora salió como la opción más barata (y qué porcentaje es).
+        Solo cuentan las cotizaciones con precio: las que quedaron sin oferta ("-") no son de nadie."""
+        donde, parametros = self._rango(desde, hasta, CON_ASEGURADORA, "con_precio > 0")
+        df = self._consultar(f"""SELECT cia_min AS aseguradora, SUM(con_precio) AS veces, SUM(suma_precio) / SUM(con_precio) AS precio_promedio
+                                 FROM resumen{donde} GROUP BY cia_min ORDER BY veces DESC""", parametros)
+        df["participacion"] = df["veces"] / df["veces"].sum() if len(df) else []
+        return df
+
+    def conversion_campana(self, desde=None, hasta=None):
+        """Por aseguradora: de las veces que fue la más barata, cuántas fueron gracias a una campaña."""
+        donde, parametros = self._rango(desde, hasta, CON_ASEGURADORA)
+        df = self._consultar(f"""SELECT cia_min AS aseguradora, SUM(cantidad) AS veces,
+                                        SUM(CASE WHEN es_campana = 'SI' THEN cantidad ELSE 0 END) AS con_campana
+                                 FROM resumen{donde} GROUP BY cia_min ORDER BY veces DESC""", parametros)
+        df["tasa_campana"] = df["con_campana"] / df["veces"] if len(df) else []
+        return df
+
+    def por_segmento(self, segmento="uso", desde=None, hasta=None):
+        """Cotizaciones y precio mínimo promedio agrupados por rol, uso, departamento o cia_min."""
+        if segmento not in SEGMENTOS: raise ValueError(f"Segmento no válido: {segmento} (usar {', '.join(SEGMENTOS)})")
+        donde, parametros = self._rango(desde, hasta)
+        return self._consultar(f"""SELECT {segmento}, SUM(cantidad) AS cotizaciones, SUM(suma_precio) / NULLIF(SUM(con_precio), 0) AS precio_promedio
+                                   FROM resumen{donde} GROUP BY {segmento} ORDER BY cotizaciones DESC""", parametros)
+
+    def exportar_csv(self, destino, desde=None, hasta=None, tamano=5000):
+        """Escribe el historial en CSV de a `tamano` filas. destino: ruta o archivo de texto abierto."""
+        donde, parametros = self._rango(desde, hasta)
+        propio = isinstance(destino, (str, os.PathLike))
+        f = open(destino, "w", newline="", encoding="utf-8-sig") if propio else destino
+        total = 0
+        try:
+            escritor = csv.writer(f)
+            escritor.writerow(COLUMNAS_HISTORIAL)
+            with self._conectar() as con:
+                cursor = con.execute(f"SELECT * FROM cotizaciones{donde} ORDER BY rowid", parametros)
+                while True:
+                    filas = cursor.fetchmany(tamano)
+                    if not filas: break
+                    escritor.writerows(filas)
+                    total += len(filas)
+        finally:
+            if propio: f.close()
+        return total
+
+class HojaEnMemoria:
+    """Reemplazo local de una hoja de gspread: guarda las filas en una lista.
+    Con fallar_veces=N las primeras N llamadas a append_rows lanzan ConnectionError."""
+    def __init__(self, fallar_veces=0):
+        self.filas = []
+        self.llamadas = 0
+        self.fallar_veces = fallar_veces
+
+    def append_rows(self, filas, **kwargs):
+        self.llamadas += 1
+        if self.llamadas <= self.fallar_veces: raise ConnectionError("Sheets no disponible (simulado)")
+        self.filas.extend(filas)
+
+class EscritorHistorial:
+    def __init__(self, almacen=None, ruta_spool="historial_pendiente.jsonl", obtener_hoja=None,
+                 tamano_lote=50, intervalo=2.0, espera_inicial=1.0, espera_max=300.0):
+        self.almacen = almacen or AlmacenHistorial()
+        self.ruta_spool = ruta_spool
+        self.obtener_hoja = obtener_hoja
+        self.destinos = ["local"] + (["sheets"] if obtener_hoja else [])
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.espera_inicial = espera_inicial
+        self.espera_max = espera_max
+
+        self._cola = queue.Queue()   # un aviso por fila registrada (para armar lotes)
+        self._lock = threading.Lock()
+        self._pendientes = {destino: [] for destino in self.destinos}   # destino -> [(id, fila)]
+        self._hoja = None
+        self._espera = espera_inicial
+        self._proximo_intento = 0.0
+        self.errores = 0
+
+        self._recuperar_spool()
+        self._hilo = threading.Thread(target=self._trabajar, name="historial", daemon=True)
+        self._hilo.start()
+
+    def registrar(self, fila):
+        """Anota una fila (lista en el orden de COLUMNAS_HISTORIAL) y vuelve enseguida."""
+        entrada = {"id": uuid.uuid4().hex, "fila": list(fila)}
+        with self._lock:
+            with open(self.ruta_spool, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entrada, ensure_ascii=False, default=str) + "\n")
+            for destino in self.destinos: self._pendientes[destino].append((entrada["id"], entrada["fila"]))
+        self._cola.put(entrada["id"])
+        return entrada["id"]
+
+    def pendientes(self):
+        with self._lock:
+            return {destino: len(filas) for destino, filas in self._pendientes.items()}
+
+    def vaciar(self, timeout=30):
+        """Espera hasta que no quede nada por escribir (o hasta timeout). Devuelve True si se vació."""
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            if not any(self.pendientes().values()): return True
+            time.sleep(0.05)
+        return False
+
+    def _recuperar_spool(self):
+        if not os.path.exists(self.ruta_spool): return
+        entradas, confirmadas = {}, {destino: set() for destino in self.destinos}
+        with open(self.ruta_spool, encoding="utf-8") as f:
+            for linea in f:
+                try: dato = json.loads(linea)
+                except ValueError: continue   # última línea a medio escribir
+                if "ack" in dato:
+                    if dato["destino"] in confirmadas: confirmadas[dato["destino"]].add(dato["ack"])
+                else: entradas[dato["id"]] = dato["fila"]
+        for destino in self.destinos:
+            self._pendientes[destino] = [(i, fila) for i, fila in entradas.items() if i not in confirmadas[destino]]
+        recuperadas = max(len(p) for p in self._pendientes.values())
+        if recuperadas: print(f"📝 Historial: {recuperadas} filas pendientes recuperadas del spool")
+        self._compactar()
+
+    def _confirmar(self, destino, lote):
+        with self._lock:
+            with open(self.ruta_spool, "a", encoding="utf-8") as f:
+                for i, _ in lote: f.write(json.dumps({"ack": i, "destino": destino}) + "\n")
+            ids = {i for i, _ in lote}
+            self._pendientes[destino] = [p for p in self._pendientes[destino] if p[0] not in ids]
+        if not any(self.pendientes().values()): self._compactar()
+
+    def _compactar(self):
+        """Reescribe el spool solo con lo pendiente (vacío si ya se escribió todo)."""
+        with self._lock:
+            if any(self._pendientes.values()):
+                vivas = {}
+                for destino, filas in self._pendientes.items():
+                    for i, fila in filas: vivas[i] = fila
+                hechas = {destino: {i for i in vivas} - {i for i, _ in filas} for destino, filas in self._pendientes.items()}
+            else:
+                vivas, hechas = {}, {}
+            temporal = self.ruta_spool + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                for i, fila in vivas.items(): f.write(json.dumps({"id": i, "fila": fila}, ensure_ascii=False, default=str) + "\n")
+                for destino, ids in hechas.items():
+                    for i in ids: f.write(json.dumps({"ack": i, "destino": destino}) + "\n")
+            os.replace(temporal, self.ruta_spool)
+
+    def _esperar_lote(self):
+        """Espera el primer aviso y sigue juntando los que lleguen durante `intervalo` (hasta tamano_lote)."""
+        try: self._cola.get(timeout=self.intervalo)
+        except queue.Empty: return
+        avisos = 1
+        limite = time.monotonic() + self.intervalo
+        while avisos < self.tamano_lote:
+            try: self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+            except queue.Empty: break
+            avisos += 1
+
+    def _trabajar(self):
+        while True:
+            self._esperar_lote()
+            try: self._escribir_local()
+            except Exception as e: print(f"❌ Error escribiendo historial local: {e}")
+            if "sheets" in self.destinos and time.monotonic() >= self._proximo_intento: self._escribir_sheets()
+
+    def _escribir_local(self):
+        with self._lock: lote = list(self._pendientes["local"])
+        if not lote: return
+        self.almacen.agregar([fila for _, fila in lote])
+        self._confirmar("local", lote)
+
+    def _escribir_sheets(self):
+        while True:
+            with self._lock: lote = self._pendientes["sheets"][:self.tamano_lote]
+            if not lote: return
+            try:
+                if self._hoja is None: self._hoja = self.obtener_hoja()
+                if self._hoja is None: raise ConnectionError("no hay conexión con Google Sheets")
+                self._hoja.append_rows([fila[:len(COLUMNAS_SHEETS)] for _, fila in lote])
+            except Exception as e:
+                # Se reconecta en el próximo intento, con espera exponencial
+                self._hoja = None
+                self.errores += 1
+                self._proximo_intento = time.monotonic() + self._espera
+                print(f"❌ Error escribiendo en Google Sheets ({len(lote)} filas, reintento en {self._espera:.0f}s): {e}")
+                self._espera = min(self._espera * 2, self.espera_max)
+                return
+            self._espera = self.espera_inicial
+            self._confirmar("sheets", lote)
+            print(f"✅ Guardado en Google Sheets ({len(lote)} filas)")
\ No newline at end of file
@@ -1,12 +1,122 @@
 import pandas as pd
+import numpy as np
 import warnings
 import re
 import os
+import threading
+import time
+import bisect
+import hashlib
+import pickle
+import multiprocessing
+from collections import Counter, OrderedDict
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from difflib import get_close_matches
 from datetime import datetime
 
 warnings.filterwarnings('ignore')
 
+ASEGURADORAS = ['Rimac', 'La Positiva', 'Pacífico', 'Protecta', 'Mapfre']
+
+# Columnas que describen a un vehículo en cotizar_lote (las mismas de /cotizar)
+COLUMNAS_VEHICULO = ['departamento', 'uso', 'clase', 'asientos', 'marca', 'modelo']
+
+# Snapshot binario de tarifarios (ver compilar_snapshot.py). Cambiar el formato si cambian los índices.
+RUTA_SNAPSHOT = 'tarifas.snapshot.pkl'
+FORMATO_SNAPSHOT = 3
+
+# Clases que ofrece el formulario (valores internos de mapa_clases en web_soat.py); sus reglas de
+# coincidencia se compilan al construir los índices, cualquier otra clase se compila al primer uso
+CLASES_USUARIO = (
+    "AUTOMOVIL", "SW", "SUV", "MULTIPROPOSITO", "PANEL", "VAN", "MICROBUS", "MINIBUS", "OMNIBUS", "PICK UP",
+    "CAMION", "REMOLCADOR", "MAQUINARIA PESADA", "MOTOCICLETA", "MOTOCICLETA ELECTRICA", "TRIMOTO", "CUATRIMOTO",
+    "FURGONETA",
+)
+
+# Usos que ofrece el formulario (selectbox de web_soat.py); junto con los usos de cada tarifario son
+# los únicos cuyos filtros quedan guardados en los índices, cualquier otro se calcula en cada pedido
+USOS_USUARIO = (
+    "PARTICULAR", "TAXI", "CARGA", "TRANSPORTE PERSONAL", "URBANO", "INTERPROVINCIAL", "COMERCIAL", "AMBULANCIA",
+    "SERVICIO ESCOLAR",
+)
+
+DEPARTAMENTOS = [
+    "AMAZONAS", "ANCASH", "APURIMAC", "AREQUIPA", "AYACUCHO", "CAJAMARCA", "CALLAO", "CUSCO",
+    "HUANCAVELICA", "HUANUCO", "ICA", "JUNIN", "LA LIBERTAD", "LAMBAYEQUE", "LIMA", "LORETO",
+    "MADRE DE DIOS", "MOQUEGUA", "PASCO", "PIURA", "PUNO", "SAN MARTIN", "TACNA", "TUMBES", "UCAYALI"
+]
+
+def hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 16), b''): h.update(bloque)
+    return h.hexdigest()
+
+
+def firma_archivo(ruta):
+    """(mtime_ns, tamaño) del archivo, o None si no existe."""
+    try:
+        st = os.stat(ruta)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def normalizar(texto):
+    if pd.isna(texto) or texto == "": return ""
+    t = str(texto).upper().strip()
+    t = t.replace('Á','A').replace('É','E').replace('Í','I').replace('Ó','O').replace('Ú','U')
+    return t
+
+
+def coincide_clase(txt, usr):
+    """Regla de clase sobre textos ya normalizados: ¿la celda CLASE `txt` acepta la clase `usr`?"""
+    if txt == usr: return True
+    if txt in ['TODOS', 'GENERAL', 'NAN', '']: return True
+    if usr == "PICK UP": return "PICK" in txt
+    if usr == "CAMION": return "CAMION" in txt and "CAMIONETA" not in txt
+    if usr == "STATION WAGON" and "SW" in txt: return True
+    if "MOTO" in usr:
+        if usr == "MOTOCICLETA" and txt == "MOTOCICLETA": return True
+        if usr == "MOTOCICLETA ELECTRICA" and "ELECTRICA" in txt: return True
+        if usr == "CUATRIMOTO" and "CUATRI" in txt: return True
+        if usr == "TRIMOTO" and "TRIMOTO" in txt: return True
+        if usr == "MOTOCICLETA" and "TRIMOTO" in txt: return False
+        return False
+    if usr in txt: return True
+    return False
+
+
+class TablaClases:
+    """Reglas de clase compiladas para un conjunto fijo de celdas CLASE.
+
+    La celda i es el bit i; cada clase de usuario tiene una máscara (int) con los bits de las celdas
+    que la aceptan, así que probar una celda es `mascara >> i & 1` y "alguna de estas celdas" es que
+    la máscara no sea 0. Las máscaras de CLASES_USUARIO se arman al crear la tabla; las de otras
+    clases (p. ej. lo que llegue libre por la API) se calculan en cada pedido y no se guardan.
+    """
+    def __init__(self, celdas, clases=CLASES_USUARIO):
+        self.celdas = [normalizar(c) for c in celdas]
+        self._mascaras = {clase: self._compilar(clase) for clase in clases}
+
+    def _compilar(self, clase):
+        usr = normalizar(clase)
+        m = 0
+        for i, txt in enumerate(self.celdas):
+            if coincide_clase(txt, usr): m |= 1 << i
+        return m
+
+    def mascara(self, clase):
+        m = self._mascaras.get(clase)
+        return self._compilar(clase) if m is None else m
+
+    def aceptadas(self, clase):
+        """Arreglo booleano por celda (para indexar con los códigos de las filas)."""
+        m = self.mascara(clase)
+        return np.array([(m >> i) & 1 == 1 for i in range(len(self.celdas))], dtype=bool)
+
+
 class AdministradorTarifas:
     def __init__(self, ruta_directorio_csv):
         self.ruta = ruta_directorio_csv
@@ -41,18 +151,725 @@ class AdministradorTarifas:
         
         df.to_csv(archivo, index=False)
         return "Opción agregada."
-    
-class SoatQuotator:
+
+
+class IndiceTarifario:
+    """Tarifario de una aseguradora precompilado para cotizar sin recorrer el DataFrame.
+
+    Se construye una sola vez por tarifario (tras cargar_datos): normaliza las columnas
+    USO / CLASE / GRUPO, convierte ASIENTOS en intervalos y agrupa las filas candidatas
+    por (uso, clase) la primera vez que se piden. El puntaje es el mismo de cotizar.
+
+    mejores_filas calcula el mismo puntaje con NumPy: uso, clase y grupo se codifican contra sus
+    valores únicos y asientos queda como dos arreglos (mínimo, máximo).
+    """
+    def __init__(self, quotator, df):
+        self.df = df
+        self.columnas = df.columns.tolist()
+        self.c_uso = quotator._buscar_columna(df, ['USO'])
+        self.c_clase = quotator._buscar_columna(df, ['CLASE', 'TIPO', 'VEHICULO', 'CATEGORIA'])
+        self.c_asientos = quotator._buscar_columna(df, ['ASIENTOS'])
+        self.c_grupo = quotator._buscar_columna(df, ['GRUPO', 'SEGMENTO'])
+        self.c_obs = quotator._buscar_columna(df, ['OBSERVACIONES', 'NOTAS'])
+        self.c_comision = quotator._buscar_columna(df, ['COMISION', '%'])
+
+        # Guardamos las filas tal cual las entrega iterrows para que el resultado sea idéntico
+        self.filas = [row for _, row in df.iterrows()]
+        self.usos = [quotator._normalizar(r[self.c_uso]) for r in self.filas] if self.c_uso else []
+        self.clases = [r[self.c_clase] for r in self.filas] if self.c_clase else []
+        self.asientos = [quotator._compilar_asientos(r[self.c_asientos]) for r in self.filas] if self.c_asientos else []
+        self.grupos = []
+        if self.c_grupo:
+            for r in self.filas:
+                r_grp = str(r[self.c_grupo]).upper()
+                es_generico = r_grp in ['GENERAL', 'TODOS', 'RESTO', '']
+                try: r_int = int(r_grp) if r_grp.isdigit() else None
+                except ValueError: r_int = None
+                self.grupos.append((r_grp, es_generico, r_int))
+        self._cod_uso, self._usos_unicos = self._codificar(self.usos)
+        self._cod_clase, self._clases_unicas = self._codificar(self.clases)
+        self._reglas_clase = TablaClases(self._clases_unicas)
+        self._cod_grupo, self._grupos_unicos = self._codificar(self.grupos)
+        self._asientos_min = np.array([r[0] if r is not None else np.nan for r in self.asientos], dtype=float)
+        self._asientos_max = np.array([r[1] if r is not None else np.nan for r in self.asientos], dtype=float)
+        self._tablas = {}
+        self._candidatos = {}
+        self.columnas_precio = {}   # departamento normalizado -> columna de precio
+
+    def __getstate__(self):
+        # En el snapshot no guardamos los buckets calculados al vuelo
+        estado = self.__dict__.copy()
+        estado['_candidatos'] = {}
+        estado['_tablas'] = {}
+        return estado
+
+    def _uso_conocido(self, u_uso):
+        return u_uso in USOS_USUARIO or u_uso in self._usos_unicos
+
+    def candidatos(self, u_uso, u_clase):
+        """Filas que pasan los filtros de uso y clase, con su puntaje parcial (en orden).
+        Solo se guardan los buckets de usos y clases conocidos: lo que llegue libre por la API se
+        calcula en cada pedido para que el índice no crezca con cada valor distinto."""
+        clave = (u_uso, u_clase)
+        bucket = self._candidatos.get(clave)
+        if bucket is None:
+            bucket = []
+            mascara = self._reglas_clase.mascara(u_clase)
+            codigos = self._cod_clase.tolist()
+            for pos, r_uso in enumerate(self.usos):
+                if u_uso == r_uso: score = 1000
+                elif u_uso in r_uso: score = 800
+                else: continue
+                if self.c_clase:
+                    if mascara >> codigos[pos] & 1: score += 500
+                    else: continue
+                bucket.append((pos, score))
+            if self._uso_conocido(u_uso) and u_clase in CLASES_USUARIO: self._candidatos[clave] = bucket
+        return bucket
+
+    def mejor_fila(self, u_uso, u_clase, grupo_target, asientos):
+        """Devuelve la fila de mayor puntaje (la primera en caso de empate) o None."""
+        mejor_score = -1
+        mejor_pos = None
+        bucket = self.candidatos(u_uso, u_clase)
+        if not bucket: return None
+
+        target_int = int(grupo_target) if str(grupo_target).isdigit() else None
+        usr_asientos = None
+
+        for pos, score in bucket:
+            if self.c_grupo:
+                r_grp, es_generico, r_int = self.grupos[pos]
+                if r_grp == grupo_target: score += 500
+                elif es_generico and grupo_target == 'GENERAL': score += 100
+                elif r_int is not None and target_int is not None and r_int == target_int: score += 500
+                else: continue
+
+            if self.c_asientos:
+                if usr_asientos is None: usr_asientos = int(asientos)
+                rango = self.asientos[pos]
+                if rango is not None and rango[0] <= usr_asientos <= rango[1]: score += 200
+                else: continue
+
+            if score > mejor_score:
+                mejor_score = score
+                mejor_pos = pos
+
+        return self.filas[mejor_pos] if mejor_pos is not None else None
+
+    @staticmethod
+    def _codificar(valores):
+        unicos = {}
+        codigos = np.array([unicos.setdefault(v, len(unicos)) for v in valores], dtype=np.intp)
+        return codigos, list(unicos)
+
+    def _tabla(self, tipo, valor):
+        """Puntaje de cada valor único de la columna `tipo` para lo que pidió el usuario (-inf = descartada).
+        Como en candidatos, las tablas de usos y clases desconocidos no se guardan (los grupos salen
+        del catálogo, así que son un conjunto cerrado)."""
+        clave = (tipo, valor)
+        tabla = self._tablas.get(clave)
+        if tabla is None:
+            if tipo == 'uso':
+                tabla = [1000 if valor == r_uso else 800 if valor in r_uso else -np.inf for r_uso in self._usos_unicos]
+            elif tipo == 'clase':
+                tabla = np.where(self._reglas_clase.aceptadas(valor), 500, -np.inf)
+            else:
+                target_int = int(valor) if str(valor).isdigit() else None
+                tabla = []
+                for r_grp, es_generico, r_int in self._grupos_unicos:
+                    if r_grp == valor: tabla.append(500)
+                    elif es_generico and valor == 'GENERAL': tabla.append(100)
+                    elif r_int is not None and target_int is not None and r_int == target_int: tabla.append(500)
+                    else: tabla.append(-np.inf)
+            tabla = np.array(tabla, dtype=float)
+            if tipo == 'grupo' or (self._uso_conocido(valor) if tipo == 'uso' else valor in CLASES_USUARIO):
+                self._tablas[clave] = tabla
+        return tabla
+
+    def _puntajes(self, tipo, valores, codigos_filas):
+        """Matriz consultas × filas con el puntaje de la columna `tipo`; las tablas se arman una vez por valor distinto."""
+        unicos = {}
+        codigos = np.array([unicos.setdefault(v, len(unicos)) for v in valores], dtype=np.intp)
+        tablas = np.stack([self._tabla(tipo, v) for v in unicos])
+        return tablas[codigos[:, None], codigos_filas[None, :]]
+
+    def mejores_filas(self, consultas):
+        """mejor_fila vectorizado para varias consultas (u_uso, u_clase, grupo_target, asientos) a la vez.
+
+        Arma la matriz de puntajes consultas × filas por broadcasting y toma el máximo de cada
+        consulta; np.argmax devuelve el primero en caso de empate, igual que mejor_fila.
+        """
+        if not consultas or not self.c_uso or not self.filas: return [None] * len(consultas)
+        puntaje = self._puntajes('uso', [c[0] for c in consultas], self._cod_uso)
+        if self.c_clase: puntaje += self._puntajes('clase', [c[1] for c in consultas], self._cod_clase)
+        if self.c_grupo: puntaje += self._puntajes('grupo', [c[2] for c in consultas], self._cod_grupo)
+        if self.c_asientos:
+            # Como en mejor_fila, los asientos solo se convierten a int si queda alguna fila candidata
+            hay_candidatas = np.isfinite(puntaje).any(axis=1)
+            usr = np.array([int(c[3]) if hay else 0 for c, hay in zip(consultas, hay_candidatas)], dtype=float)[:, None]
+            dentro = (self._asientos_min <= usr) & (usr <= self._asientos_max)
+            puntaje += np.where(dentro, 200, -np.inf)
+
+        mejores = puntaje.argmax(axis=1)
+        validas = np.isfinite(puntaje[np.arange(len(consultas)), mejores])
+        return [self.filas[pos] if valida else None for pos, valida in zip(mejores.tolist(), validas.tolist())]
+
+
+class IndiceGrupos:
+    """Catálogo de grupos (marca/modelo -> grupo) de una aseguradora indexado por marca y modelo.
+
+    Cada fila del catálogo se registra bajo (marca, modelo) por cada modelo de su lista y,
+    si la celda dice "TODOS", en el bucket comodín de la marca. Las posiciones se guardan en
+    orden para conservar la regla de "la primera fila que coincide gana".
+    """
+    def __init__(self, quotator, df):
+        self.df = df
+        self.c_mar = quotator._buscar_columna(df, ['MARCA'])
+        self.c_mod = quotator._buscar_columna(df, ['MODELO', 'MODELOS'])
+        self.c_grp = quotator._buscar_columna(df, ['GRUPO', 'SEGMENTO'])
+        self.c_cla = quotator._buscar_columna(df, ['CLASE', 'TIPO', 'VEHICULO'])
+        self.c_uso = quotator._buscar_columna(df, ['USO'])
+
+        self.por_modelo = {}   # marca -> {modelo: [posiciones]}
+        self.todos = {}        # marca -> [posiciones] de filas con "TODOS" en el modelo
+        self.clases = []
+        self.usos = []
+        self.grupos = []
+        if not (self.c_mar and self.c_mod and self.c_grp): return
+
+        for pos, (_, row) in enumerate(df.iterrows()):
+            r_mar = quotator._normalizar(row[self.c_mar])
+            r_mod = quotator._normalizar(row[self.c_mod])
+            modelos_marca = self.por_modelo.setdefault(r_mar, {})
+            for m in set(x.strip() for x in r_mod.replace('/', ',').split(',')):
+                modelos_marca.setdefault(m, []).append(pos)
+            if "TODOS" in r_mod: self.todos.setdefault(r_mar, []).append(pos)
+
+            self.clases.append(row[self.c_cla] if self.c_cla else None)
+            if self.c_uso:
+                r_uso = quotator._normalizar(row[self.c_uso])
+                self.usos.append([x.strip() for x in re.split(r'[,/]', r_uso)])
+            raw_grp = str(row[self.c_grp]).upper()
+            if raw_grp.endswith('.0'): raw_grp = raw_grp[:-2]
+            self.grupos.append(raw_grp)
+        cod_clase, clases_unicas = IndiceTarifario._codificar(self.clases)
+        self._cod_clase = cod_clase.tolist()
+        self._reglas_clase = TablaClases(clases_unicas)
+
+    def candidatos(self, u_mar, u_mod):
+        """Posiciones (en orden del catálogo) cuya marca y modelo coinciden."""
+        exactos = self.por_modelo.get(u_mar, {}).get(u_mod, [])
+        comodin = self.todos.get(u_mar, [])
+        if not comodin: return exactos
+        if not exactos: return comodin
+        return sorted(set(exactos) | set(comodin))
+
+    def detectar(self, u_mar, u_mod, clase, u_uso):
+        if not (self.c_mar and self.c_mod and self.c_grp): return "GENERAL"
+
+        mascara = self._reglas_clase.mascara(clase) if self.c_cla else 0
+        for pos in self.candidatos(u_mar, u_mod):
+            # Validación de Clase (Si existe en catálogo)
+            if self.c_cla:
+                if not mascara >> self._cod_clase[pos] & 1: continue
+
+            # Validación de USO: "PARTICULAR, TAXI" acepta cualquiera de los dos,
+            # y también se acepta el match parcial (Ej: "ESCOLAR" dentro de "SERVICIO ESCOLAR")
+            if self.c_uso:
+                usos_fila = self.usos[pos]
+                if u_uso not in usos_fila and not any(u in u_uso for u in usos_fila): continue
+
+            return self.grupos[pos]
+        return "GENERAL"
+
+
+class IndiceSugerencias:
+    """Autocompletado de marcas y modelos sobre el catálogo normalizado.
+
+    Cada marca se indexa por su nombre y cada modelo por "MODELO" y "MARCA MODELO". Los puntajes
+    van por niveles y cada nivel solo se busca si el anterior no llenó el límite:
+      3      la clave es igual a la consulta
+      2..3   la clave empieza con la consulta (rango contiguo en las claves ordenadas)
+      1.5..2 cada palabra de la consulta es prefijo de alguna palabra de la clave
+      0.3..1 parecido por trigramas (tolera errores de tipeo)
+    Dentro de un nivel gana la clave más corta.
+    """
+    MAX_CANDIDATOS_TRIGRAMA = 200
+    PARECIDO_MINIMO = 0.3
+
+    def __init__(self, catalogo):
+        self.entradas = []      # (tipo, marca, modelo, claves)
+        for marca, modelos in catalogo.items():
+            self.entradas.append(('marca', marca, None, (marca,)))
+            for modelo in modelos:
+                self.entradas.append(('modelo', marca, modelo, (modelo, f"{marca} {modelo}")))
+
+        claves, palabras = [], []
+        self.trigramas_claves = []   # por entrada, los trigramas de cada clave
+        self.palabras_claves = []    # por entrada, las palabras de cada clave
+        self._por_trigrama = {}
+        for pos, (_, _, _, claves_entrada) in enumerate(self.entradas):
+            trigramas = [self._trigramas(clave) for clave in claves_entrada]
+            self.trigramas_claves.append(trigramas)
+            self.palabras_claves.append([clave.split() for clave in claves_entrada])
+            for tri in set().union(*trigramas): self._por_trigrama.setdefault(tri, []).append(pos)
+            claves.extend((clave, pos) for clave in claves_entrada)
+            palabras.extend((palabra, pos) for clave in claves_entrada for palabra in clave.split())
+        claves.sort()
+        palabras.sort()
+        self._claves, self._claves_pos = [c for c, _ in claves], [pos for _, pos in claves]
+        self._palabras, self._palabras_pos = [p for p, _ in palabras], [pos for _, pos in palabras]
+
+    @staticmethod
+    def _trigramas(texto):
+        t = f"  {texto} "
+        return {t[i:i + 3] for i in range(len(t) - 2)}
+
+    @staticmethod
+    def _rango(ordenadas, prefijo):
+        i = bisect.bisect_left(ordenadas, prefijo)
+        return i, bisect.bisect_left(ordenadas, prefijo + '\uffff', i)
+
+    def sugerir(self, q, marca=None, limite=10):
+        """Lista de sugerencias {tipo, marca, modelo, puntaje} ordenadas de mejor a peor.
+        q y marca ya deben venir normalizados; con marca solo se sugieren modelos de esa marca."""
+        palabras_q = q.split()
+        if not palabras_q or limite <= 0: return []
+        q = " ".join(palabras_q)
+        puntajes = {}   # pos -> mejor puntaje
+
+        def anotar(pos, puntaje):
+            if marca and (self.entradas[pos][0] != 'modelo' or self.entradas[pos][1] != marca): return
+            if puntaje > puntajes.get(pos, 0): puntajes[pos] = puntaje
+
+        inicio, fin = self._rango(self._claves, q)
+        for k in range(inicio, fin):
+            clave = self._claves[k]
+            anotar(self._claves_pos[k], 3.0 if clave == q else 2 + len(q) / len(clave))
+
+        if len(puntajes) < limite:
+            candidatos = None
+            for palabra in palabras_q:
+                inicio, fin = self._rango(self._palabras, palabra)
+                con_palabra = set(self._palabras_pos[inicio:fin])
+                candidatos = con_palabra if candidatos is None else candidatos & con_palabra
+            for pos in candidatos - puntajes.keys():
+                for clave, palabras in zip(self.entradas[pos][3], self.palabras_claves[pos]):
+                    if all(any(p.startswith(pq) for p in palabras) for pq in palabras_q):
+                        anotar(pos, 1.5 + len(q) / len(clave) / 2)
+
+        if len(puntajes) < limite:
+            tri_q = self._trigramas(q)
+            compartidos = Counter()
+            for tri in tri_q: compartidos.update(self._por_trigrama.get(tri, ()))
+            for pos, _ in compartidos.most_common(self.MAX_CANDIDATOS_TRIGRAMA):
+                if pos in puntajes: continue
+                parecido = max(2 * len(tri_q & tri) / (len(tri_q) + len(tri)) for tri in self.trigramas_claves[pos])
+                if parecido >= self.PARECIDO_MINIMO: anotar(pos, parecido)
+
+        mejores = sorted(puntajes, key=lambda pos: (-puntajes[pos], len(self.entradas[pos][3][-1]), self.entradas[pos][3][-1]))
+        return [{"tipo": self.entradas[pos][0], "marca": self.entradas[pos][1], "modelo": self.entradas[pos][2],
+                 "puntaje": round(puntajes[pos], 3)} for pos in mejores[:limite]]
+
+
+class AlmacenCampanas:
+    """Campañas vigentes leídas de campanas.xlsx (o campanas.csv) una sola vez.
+
+    La hoja se normaliza y sus fechas se parsean al cargarla; solo se vuelve a leer cuando
+    cambia la fecha de modificación o el tamaño del archivo. indice() devuelve un diccionario
+    (aseguradora, uso) -> campañas en orden que nunca se modifica, así que sirve como foto
+    consistente durante toda una cotización.
+    """
+    def __init__(self, quotator, ruta_xlsx='campanas.xlsx', ruta_csv='campanas.csv'):
+        self.ruta_xlsx = ruta_xlsx
+        self.ruta_csv = ruta_csv
+        self._normalizar = quotator._normalizar
+        self._buscar_columna = quotator._buscar_columna
+        self._firma = None
+        self._indice = {}
+        self._fronteras = []
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _firma_archivos(self):
+        firma = []
+        for ruta in (self.ruta_xlsx, self.ruta_csv):
+            try:
+                st = os.stat(ruta)
+                firma.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                firma.append(None)
+        return tuple(firma)
+
+    def indice(self):
+        """Índice vigente de campañas; se recarga solo si el archivo cambió."""
+        firma = self._firma_archivos()
+        if firma != self._firma:
+            with self._lock:
+                if firma != self._firma:
+                    self._indice = self._leer()
+                    # Una campaña se activa en su inicio y se apaga justo después de su fin
+                    self._fronteras = sorted({f for campanas in self._indice.values() for c in campanas
+                                              for f in (c['inicio'], c['fin'] + pd.Timedelta(1)) if pd.notna(f)})
+                    self._firma = firma
+                    self.version += 1
+        return self._indice
+
+    def hash_archivo(self):
+        """sha256 del archivo de campañas en uso (xlsx o, si no existe, csv); None si no hay archivo."""
+        for ruta in (self.ruta_xlsx, self.ruta_csv):
+            if os.path.exists(ruta): return hash_archivo(ruta)
+        return None
+
+    def exportar(self):
+        """Índice ya parseado, para guardarlo en el snapshot."""
+        self.indice()
+        return {'sha256': self.hash_archivo(), 'indice': self._indice, 'fronteras': self._fronteras}
+
+    def sembrar(self, datos):
+        """Usa el índice de un snapshot si el archivo de campañas no cambió desde entonces."""
+        if not datos or datos.get('sha256') != self.hash_archivo(): return False
+        with self._lock:
+            self._indice = datos['indice']
+            self._fronteras = datos['fronteras']
+            self._firma = self._firma_archivos()
+            self.version += 1
+        return True
+
+    def proxima_frontera(self, momento):
+        """Próximo instante (> momento) en que alguna campaña se activa o se apaga; None si no hay."""
+        i = bisect.bisect_right(self._fronteras, momento)
+        return self._fronteras[i] if i < len(self._fronteras) else None
+
+    @staticmethod
+    def _parse_fechas(serie):
+        for fmt in ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y']:
+            try: return pd.to_datetime(serie, format=fmt)
+            except: continue
+        return pd.to_datetime(serie, errors='coerce')
+
+    def _leer(self):
+        try:
+            df_c = None
+            if os.path.exists(self.ruta_xlsx):
+                try: df_c = pd.read_excel(self.ruta_xlsx)
+                except: pass
+            if df_c is None and os.path.exists(self.ruta_csv):
+                try: df_c = pd.read_csv(self.ruta_csv, encoding='latin-1', sep=None, engine='python')
+                except: pass
+
+            if df_c is None: return {}
+
+            df_c.columns = [self._normalizar(c) for c in df_c.columns]
+
+            c_aseg = self._buscar_columna(df_c, ['ASEGURADORA', 'COMPAÑIA'])
+            c_dep = self._buscar_columna(df_c, ['DEPARTAMENTO', 'REGION'])
+            c_uso = self._buscar_columna(df_c, ['USO'])
+            c_clase = self._buscar_columna(df_c, ['CLASE', 'TIPO'])
+            c_precio = self._buscar_columna(df_c, ['PRECIO', 'COSTO'])
+            c_inicio = self._buscar_columna(df_c, ['INICIO', 'DESDE'])
+            c_fin = self._buscar_columna(df_c, ['FIN', 'HASTA'])
+            c_nombre = self._buscar_columna(df_c, ['NOMBRE', 'CAMPAÑA'])
+            c_modelos_campana = self._buscar_columna(df_c, ['MODELOS', 'MODELO'])
+
+            if not (c_aseg and c_uso and c_clase and c_precio and c_dep and c_inicio and c_fin): return {}
+
+            for col in [c_aseg, c_dep, c_uso, c_clase]:
+                df_c[col] = df_c[col].apply(self._normalizar)
+
+            df_c[c_inicio] = self._parse_fechas(df_c[c_inicio])
+            df_c[c_fin] = self._parse_fechas(df_c[c_fin])
+
+            indice = {}
+            for _, row in df_c.iterrows():
+                modelos = None
+                if c_modelos_campana:
+                    modelos_campana = self._normalizar(row[c_modelos_campana])
+                    if modelos_campana not in ['TODOS', 'TODAS', 'GENERAL', '', 'NAN']:
+                        modelos = [x.strip() for x in re.split(r'[,/]', modelos_campana)]
+
+                clases = [x.strip() for x in re.split(r'[,/]', str(row[c_clase]))]
+                campana = {
+                    'departamento': row[c_dep],
+                    'inicio': row[c_inicio],
+                    'fin': row[c_fin],
+                    'clases': clases,
+                    'reglas_clase': TablaClases(clases),
+                    'modelos': modelos,
+                    'precio': re.sub(r'[^\d.]', '', str(row[c_precio])),
+                    'nombre': row[c_nombre] if c_nombre and pd.notna(row[c_nombre]) else "Oferta Especial",
+                }
+                indice.setdefault((row[c_aseg], row[c_uso]), []).append(campana)
+            return indice
+        except Exception as e:
+            print(f"Error carga campañas: {e}")
+            return {}
+
+    def activa(self, aseguradora, departamento, uso, clase, modelo_user, momento=None, indice=None):
+        """Campaña activa (precio, nombre) para el vehículo en el momento dado, o (None, None)."""
+        if indice is None: indice = self.indice()
+        if momento is None: momento = pd.Timestamp.now()
+
+        u_dep = self._normalizar(departamento)
+        u_cla = self._normalizar(clase)
+        u_mod = self._normalizar(modelo_user)
+
+        for campana in indice.get((self._normalizar(aseguradora), self._normalizar(uso)), []):
+            if campana['departamento'] != u_dep and campana['departamento'] not in ['TODOS', 'TODAS']: continue
+            if not (campana['inicio'] <= momento and campana['fin'] >= momento): continue
+
+            list_clases = campana['clases']
+            if u_cla not in list_clases and not campana['reglas_clase'].mascara(u_cla): continue
+
+            if campana['modelos'] is not None and u_mod not in campana['modelos']: continue
+
+            if campana['precio']:
+                try: return float(campana['precio']), campana['nombre']
+                except ValueError: return None, None
+        return None, None
+
+
+class EstadoTarifas:
+    """Datos cargados de las aseguradoras (DataFrames + índices compilados).
+
+    Una vez publicado no se modifica: recargar arma uno nuevo reutilizando lo que no cambió y
+    lo reemplaza de una sola vez, así una cotización en curso nunca ve datos a medio cargar.
+    """
     def __init__(self):
         self.data_tarifarios = {}
         self.data_grupos = {}
         self.data_zonas = {}
+        self.indices_tarifarios = {}
+        self.indices_grupos = {}
+        self.firmas = {}   # ruta -> (mtime_ns, tamaño) del archivo leído
+        self.version = 0
+        # True si alguna tabla se asignó a mano (los procesos de modo 'procesos' solo tienen los archivos)
+        self.editado = False
+        # Se calculan la primera vez que se piden (obtener_catalogo_vehiculos / obtener_clases_vehiculo)
+        self.catalogo = None
+        self.clases = None
+        self.sugerencias = None
+
+    def copiar_aseguradora(self, destino, nombre):
+        for attr in ['data_tarifarios', 'data_grupos', 'data_zonas', 'indices_tarifarios', 'indices_grupos']:
+            origen = getattr(self, attr)
+            if nombre in origen: getattr(destino, attr)[nombre] = origen[nombre]
+
+    def copiar_sin(self, excluidas):
+        """Copia superficial del estado sin los datos de las aseguradoras excluidas."""
+        excluidas = set(excluidas)
+        nuevo = EstadoTarifas()
+        for nombre in ASEGURADORAS:
+            if nombre not in excluidas: self.copiar_aseguradora(nuevo, nombre)
+        nuevo.firmas = dict(self.firmas)
+        nuevo.editado = self.editado
+        return nuevo
+
+
+class CacheCotizaciones:
+    """Cache LRU con vencimiento para los resultados de cotizar.
+
+    Cada entrada vence por TTL o cuando llega la próxima frontera de campañas (inicio o fin de
+    alguna promoción), lo que ocurra primero, para que las promociones se prendan y apaguen a
+    tiempo. Se vacía por completo al recargar tarifarios o campañas.
+    """
+    def __init__(self, max_items=1024, ttl=300):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._datos = OrderedDict()   # clave -> (vence_monotonic, vence_campana, registros)
+        self._lock = threading.Lock()
+        self.generacion = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def obtener(self, clave, hoy):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                vence, vence_campana, registros = entrada
+                if time.monotonic() < vence and (vence_campana is None or hoy < vence_campana):
+                    self._datos.move_to_end(clave)
+                    self.hits += 1
+                    return registros
+                del self._datos[clave]
+            self.misses += 1
+            return None
+
+    def guardar(self, clave, registros, vence_campana):
+        if self.max_items <= 0: return
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.ttl, vence_campana, registros)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def limpiar(self, generacion=None):
+        with self._lock:
+            self._datos.clear()
+            self.generacion = generacion
+
+    def estadisticas(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "items": len(self._datos), "max_items": self.max_items, "ttl": self.ttl}
+
+
+class MetricasCotizador:
+    """Tiempos por etapa y aseguradora (histogramas) y contadores del motor, exportables en
+    formato de texto de Prometheus.
+
+    Se activa con SoatQuotator(metricas=MetricasCotizador()); con metricas=None el motor no toma
+    ningún tiempo. Las etapas son: cotizar, cotizar_lote, campanas (revisar/leer campanas.xlsx) y,
+    por aseguradora, grupo, columna_precio, tarifario y campana.
+    """
+    LIMITES = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, limites=LIMITES):
+        self.limites = tuple(limites)
+        self._lock = threading.Lock()
+        self._histogramas = {}   # (etapa, aseguradora) -> [conteo por límite..., conteo > último, suma]
+        self._contadores = {}    # (nombre, aseguradora) -> valor
+
+    def observar(self, etapa, aseguradora, segundos):
+        pos = bisect.bisect_left(self.limites, segundos)
+        with self._lock:
+            h = self._histogramas.get((etapa, aseguradora))
+            if h is None: h = self._histogramas[(etapa, aseguradora)] = [0] * (len(self.limites) + 1) + [0.0]
+            h[pos] += 1
+            h[-1] += segundos
+
+    def medir(self, etapa, aseguradora, inicio):
+        """Registra el tiempo desde `inicio` (perf_counter) y devuelve el instante actual para encadenar etapas."""
+        ahora = time.perf_counter()
+        self.observar(etapa, aseguradora, ahora - inicio)
+        return ahora
+
+    def contar(self, nombre, aseguradora="", valor=1):
+        with self._lock:
+            clave = (nombre, aseguradora)
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    @staticmethod
+    def _etiquetas(**etiquetas):
+        # Los valores son nombres de etapa/aseguradora y límites: no llevan comillas que escapar
+        pares = [f'{k}="{v}"' for k, v in etiquetas.items() if v != ""]
+        return "{" + ",".join(pares) + "}" if pares else ""
+
+    def exportar(self, cache=None):
+        """Texto para /metrics. `cache` es el dict de estadisticas_cache() (opcional)."""
+        with self._lock:
+            histogramas = {k: list(v) for k, v in self._histogramas.items()}
+            contadores = dict(self._contadores)
 
-    def _normalizar(self, texto):
-        if pd.isna(texto) or texto == "": return ""
-        t = str(texto).upper().strip()
-        t = t.replace('Á','A').replace('É','E').replace('Í','I').replace('Ó','O').replace('Ú','U')
-        return t
+        lineas = ["# HELP soat_etapa_segundos Duración de cada etapa de la cotización",
+                  "# TYPE soat_etapa_segundos histogram"]
+        for (etapa, aseguradora), h in sorted(histogramas.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.limites + ('+Inf',), h[:-1]):
+                acumulado += conteo
+                lineas.append(f"soat_etapa_segundos_bucket{self._etiquetas(etapa=etapa, aseguradora=aseguradora, le=limite)} {acumulado}")
+            etiquetas = self._etiquetas(etapa=etapa, aseguradora=aseguradora)
+            lineas.append(f"soat_etapa_segundos_sum{etiquetas} {h[-1]}")
+            lineas.append(f"soat_etapa_segundos_count{etiquetas} {acumulado}")
+
+        for nombre in sorted({n for n, _ in contadores}):
+            lineas.append(f"# TYPE soat_{nombre}_total counter")
+            for (n, aseguradora), valor in sorted(contadores.items()):
+                if n == nombre: lineas.append(f"soat_{nombre}_total{self._etiquetas(aseguradora=aseguradora)} {valor}")
+
+        if cache:
+            for nombre in ("hits", "misses", "evictions"):
+                lineas += [f"# TYPE soat_cache_{nombre}_total counter", f"soat_cache_{nombre}_total {cache[nombre]}"]
+            lineas += ["# TYPE soat_cache_items gauge", f"soat_cache_items {cache['items']}"]
+        return "\n".join(lineas) + "\n"
+
+
+# Cómo cotizar las aseguradoras dentro de una cotización: None (una tras otra, el modo por defecto),
+# 'hilos' o 'procesos'. Los dos modos paralelos son experimentales y opcionales: cada aseguradora
+# tarda décimas de milisegundo y el reparto cuesta más que lo que ahorra (medido con una
+# cotización: ~0.65 ms una tras otra, ~1.9 ms con hilos, ~12 ms con procesos)
+MODOS_PARALELO = (None, 'hilos', 'procesos')
+# Segundos que se espera a las aseguradoras en paralelo antes de cotizarlas en el propio proceso
+TIMEOUT_PARALELO = 5
+
+class EstadoDesactualizado(Exception):
+    pass
+
+_MOTOR_PROCESO = None
+
+def _iniciar_proceso(rutas, ruta_snapshot):
+    # Los procesos salen del forkserver, no de este proceso (que ya tiene hilos y puede tener locks
+    # tomados), así que cargan su propia copia de las tarifas: del snapshot si está al día
+    global _MOTOR_PROCESO
+    _MOTOR_PROCESO = SoatQuotator()
+    _MOTOR_PROCESO.cargar_datos(*rutas, ruta_snapshot=ruta_snapshot)
+
+def _proceso_listo():
+    return True
+
+def _cotizar_aseguradora_en_proceso(firmas, aseguradora, args):
+    estado = _MOTOR_PROCESO._estado
+    # Solo se cotiza si el proceso cargó los mismos archivos que el motor que pidió la cotización
+    if not firmas or estado.firmas != firmas: raise EstadoDesactualizado(aseguradora)
+    return _MOTOR_PROCESO._cotizar_aseguradora(aseguradora, *args, estado)
+
+class SoatQuotator:
+    def __init__(self, cache_max=1024, cache_ttl=300, modo_paralelo=None, puntaje_vectorizado=False, metricas=None):
+        if modo_paralelo not in MODOS_PARALELO: raise ValueError(f"modo_paralelo inválido: {modo_paralelo}")
+        self._estado = EstadoTarifas()
+        self._lock_recarga = threading.Lock()
+        self.campanas = AlmacenCampanas(self)
+        self.version_datos = 0
+        self.rutas = []
+        self.ruta_snapshot = None
+        self.hash_datos = None
+        self.cache = CacheCotizaciones(cache_max, cache_ttl)
+        self.modo_paralelo = modo_paralelo
+        # True: elige la fila del tarifario con IndiceTarifario.mejores_filas (NumPy) en vez de mejor_fila
+        self.puntaje_vectorizado = puntaje_vectorizado
+        # MetricasCotizador o None (sin instrumentación)
+        self.metricas = metricas
+        self._ejecutor = None
+        self._ejecutor_listo = None
+        self._lock_ejecutor = threading.Lock()
+
+    # Los datos viven en self._estado; estas propiedades mantienen la interfaz de siempre
+    @property
+    def data_tarifarios(self): return self._estado.data_tarifarios
+    @data_tarifarios.setter
+    def data_tarifarios(self, valor): self._reemplazar_datos(data_tarifarios=valor)
+
+    @property
+    def data_grupos(self): return self._estado.data_grupos
+    @data_grupos.setter
+    def data_grupos(self, valor): self._reemplazar_datos(data_grupos=valor)
+
+    @property
+    def data_zonas(self): return self._estado.data_zonas
+    @data_zonas.setter
+    def data_zonas(self, valor): self._reemplazar_datos(data_zonas=valor)
+
+    def _reemplazar_datos(self, **tablas):
+        """Asignar tablas por fuera de cargar_datos publica un estado nuevo, como una recarga: otra
+        versión (el cache no devuelve precios viejos) y catálogo/clases/sugerencias por recalcular."""
+        with self._lock_recarga:
+            nuevo = self._estado.copiar_sin([])
+            for attr, valor in tablas.items(): setattr(nuevo, attr, valor)
+            # Las columnas de precio de los índices dependen de las zonas: se recompilan al usarse
+            if 'data_zonas' in tablas: nuevo.indices_tarifarios = {}
+            nuevo.editado = True
+            self._publicar(nuevo)
+
+    @property
+    def indices_tarifarios(self): return self._estado.indices_tarifarios
+
+    @property
+    def indices_grupos(self): return self._estado.indices_grupos
+
+    _normalizar = staticmethod(normalizar)
 
     def _buscar_columna(self, df, keywords):
         if df is None: return None
@@ -64,46 +881,203 @@ class SoatQuotator:
                 if k in c: return c
         return None
 
-    def cargar_datos(self, r_rimac, r_positiva, r_pacifico, r_protecta, r_mapfre):
-        nombres = ['Rimac', 'La Positiva', 'Pacífico', 'Protecta', 'Mapfre']
+    def cargar_datos(self, r_rimac, r_positiva, r_pacifico, r_protecta, r_mapfre, ruta_snapshot=None):
+        """Carga los tarifarios. Si se indica ruta_snapshot y el snapshot es más nuevo que los
+        Excel (y coincide su hash de contenido), se carga de ahí en vez de parsear los Excel."""
+        nombres = ASEGURADORAS
         rutas = [r_rimac, r_positiva, r_pacifico, r_protecta, r_mapfre]
-        
+        self.rutas = rutas
+        self.ruta_snapshot = ruta_snapshot
+
+        if ruta_snapshot and self.cargar_snapshot(ruta_snapshot): return
+
+        estado = EstadoTarifas()
         for nombre, ruta in zip(nombres, rutas):
+            firma = firma_archivo(ruta)
             try:
-                if ruta.endswith('.csv'):
-                    try: df = pd.read_csv(ruta, encoding='latin-1', sep=None, engine='python')
-                    except: df = pd.read_csv(ruta)
-                    hojas = {nombre: df}
-                else:
-                    xls = pd.ExcelFile(ruta)
-                    hojas = {h: pd.read_excel(xls, h) for h in xls.sheet_names}
-
-                for nombre_hoja, df in hojas.items():
-                    hoja_norm = self._normalizar(nombre_hoja)
-                    if ruta.endswith('.csv'):
-                        cols_str = " ".join([str(c).upper() for c in df.columns])
-                        if "CIRCULA" in cols_str or "ZONA" in cols_str: hoja_norm = "ZONAS"
-                        elif "MODELO" in cols_str: hoja_norm = "GRUPOS"
-                        elif "PRECIO" in cols_str or "LIMA" in cols_str or "COMISION" in cols_str: hoja_norm = "TARIFARIO"
-
-                    df.columns = [self._normalizar(c) for c in df.columns]
-                    
-                    if 'ZONA' in hoja_norm: 
-                        self.data_zonas[nombre] = df
-                    elif 'GRUPO' in hoja_norm or 'USO' in hoja_norm or 'SEGMENTACION' in hoja_norm:
-                        if nombre in self.data_grupos:
-                            self.data_grupos[nombre] = pd.concat([self.data_grupos[nombre], df], ignore_index=True)
-                        else:
-                            self.data_grupos[nombre] = df
-                    elif 'TARIF' in hoja_norm or 'PRECIO' in hoja_norm: 
-                        self.data_tarifarios[nombre] = df
+                self._leer_aseguradora(estado, nombre, ruta)
+                estado.firmas[ruta] = firma
             except Exception as e:
                 print(f"Error carga {nombre}: {e}")
 
+        self._compilar_indices(estado)
+        self._publicar(estado)
+
+    def _leer_aseguradora(self, estado, nombre, ruta):
+        """Lee todas las hojas de una aseguradora y las deja en estado (tarifario, grupos, zonas)."""
+        if ruta.endswith('.csv'):
+            try: df = pd.read_csv(ruta, encoding='latin-1', sep=None, engine='python')
+            except: df = pd.read_csv(ruta)
+            hojas = {nombre: df}
+        else:
+            xls = pd.ExcelFile(ruta)
+            hojas = {h: pd.read_excel(xls, h) for h in xls.sheet_names}
+
+        for nombre_hoja, df in hojas.items():
+            hoja_norm = self._normalizar(nombre_hoja)
+            if ruta.endswith('.csv'):
+                cols_str = " ".join([str(c).upper() for c in df.columns])
+                if "CIRCULA" in cols_str or "ZONA" in cols_str: hoja_norm = "ZONAS"
+                elif "MODELO" in cols_str: hoja_norm = "GRUPOS"
+                elif "PRECIO" in cols_str or "LIMA" in cols_str or "COMISION" in cols_str: hoja_norm = "TARIFARIO"
+
+            df.columns = [self._normalizar(c) for c in df.columns]
+            
+            if 'ZONA' in hoja_norm: 
+                estado.data_zonas[nombre] = df
+            elif 'GRUPO' in hoja_norm or 'USO' in hoja_norm or 'SEGMENTACION' in hoja_norm:
+                if nombre in estado.data_grupos:
+                    estado.data_grupos[nombre] = pd.concat([estado.data_grupos[nombre], df], ignore_index=True)
+                else:
+                    estado.data_grupos[nombre] = df
+            elif 'TARIF' in hoja_norm or 'PRECIO' in hoja_norm: 
+                estado.data_tarifarios[nombre] = df
+
+    def _compilar_indices(self, estado, aseguradoras=None):
+        """Precompila los tarifarios y catálogos de estado (solo los de `aseguradoras` si se indica)."""
+        for nombre, df in estado.data_tarifarios.items():
+            if df is None or (aseguradoras is not None and nombre not in aseguradoras): continue
+            indice = IndiceTarifario(self, df)
+            for dep in DEPARTAMENTOS:
+                self._columna_precio(nombre, indice, dep, estado)
+            estado.indices_tarifarios[nombre] = indice
+        for nombre, df in estado.data_grupos.items():
+            if df is None or (aseguradoras is not None and nombre not in aseguradoras): continue
+            estado.indices_grupos[nombre] = IndiceGrupos(self, df)
+
+    def _publicar(self, estado):
+        """Cambia de una sola vez el estado en uso: las cotizaciones en curso terminan con el anterior."""
+        estado.version = self.version_datos + 1
+        self._estado = estado
+        self.version_datos = estado.version
+        self.cache.limpiar()
+        # Los procesos tienen la foto anterior: se crean de nuevo con el próximo pedido
+        if self.modo_paralelo == 'procesos': self._cerrar_ejecutor()
+
+    def recargar(self, en_segundo_plano=False):
+        """Vuelve a leer solo los archivos de tarifas que cambiaron y publica el nuevo estado de
+        forma atómica (copy-on-write), sin detener las cotizaciones. Con en_segundo_plano=True
+        corre en un hilo y devuelve el hilo. Devuelve la lista de aseguradoras recargadas."""
+        if en_segundo_plano:
+            hilo = threading.Thread(target=self.recargar, name="recarga-tarifas", daemon=True)
+            hilo.start()
+            return hilo
+
+        with self._lock_recarga:
+            actual = self._estado
+            cambiadas = [(nombre, ruta) for nombre, ruta in zip(ASEGURADORAS, self.rutas)
+                         if firma_archivo(ruta) != actual.firmas.get(ruta)]
+            if not cambiadas: return []
+
+            nuevo = actual.copiar_sin(nombre for nombre, _ in cambiadas)
+            recargadas = []
+            for nombre, ruta in cambiadas:
+                firma = firma_archivo(ruta)
+                try:
+                    self._leer_aseguradora(nuevo, nombre, ruta)
+                    nuevo.firmas[ruta] = firma
+                    recargadas.append(nombre)
+                except Exception as e:
+                    # Si el archivo quedó a medio guardar seguimos con los datos anteriores
+                    print(f"Error recarga {nombre}: {e}")
+                    actual.copiar_aseguradora(nuevo, nombre)
+
+            self._compilar_indices(nuevo, recargadas)
+            self._publicar(nuevo)
+            print(f"🔄 Tarifas recargadas: {', '.join(recargadas) or 'ninguna'}")
+            return recargadas
+
+    def vigilar_cambios(self, intervalo=5):
+        """Hilo que revisa cada `intervalo` segundos si algún tarifario cambió y lo recarga."""
+        def _vigilar():
+            while True:
+                time.sleep(intervalo)
+                try: self.recargar()
+                except Exception as e: print(f"Error vigilando tarifas: {e}")
+        hilo = threading.Thread(target=_vigilar, name="vigilar-tarifas", daemon=True)
+        hilo.start()
+        return hilo
+
+    def _hash_fuentes(self, rutas):
+        return {ruta: hash_archivo(ruta) for ruta in rutas if os.path.exists(ruta)}
+
+    def guardar_snapshot(self, ruta_snapshot):
+        """Guarda en un solo archivo los DataFrames ya normalizados, los índices compilados y las
+        campañas parseadas, junto con el sha256 de cada archivo fuente."""
+        fuentes = self._hash_fuentes(self.rutas)
+        estado = self._estado
+        snapshot = {
+            'formato': FORMATO_SNAPSHOT,
+            'fuentes': fuentes,
+            'hash': hashlib.sha256(repr(sorted(fuentes.items())).encode()).hexdigest(),
+            'data_tarifarios': estado.data_tarifarios,
+            'data_grupos': estado.data_grupos,
+            'data_zonas': estado.data_zonas,
+            'indices_tarifarios': estado.indices_tarifarios,
+            'indices_grupos': estado.indices_grupos,
+            'campanas': self.campanas.exportar(),
+        }
+        tmp = f"{ruta_snapshot}.tmp"
+        with open(tmp, 'wb') as f: pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, ruta_snapshot)
+        return snapshot['hash']
+
+    def cargar_snapshot(self, ruta_snapshot):
+        """Carga el snapshot si es más nuevo que los archivos fuente y su contenido coincide.
+        Devuelve False (sin tocar los datos) si hay que volver a leer los Excel."""
+        try:
+            if not os.path.exists(ruta_snapshot): return False
+            mtime = os.path.getmtime(ruta_snapshot)
+            if any(not os.path.exists(r) or os.path.getmtime(r) > mtime for r in self.rutas): return False
+
+            with open(ruta_snapshot, 'rb') as f: snapshot = pickle.load(f)
+            if snapshot.get('formato') != FORMATO_SNAPSHOT: return False
+            if snapshot['fuentes'] != self._hash_fuentes(self.rutas): return False
+        except Exception as e:
+            print(f"Snapshot inválido, se leerán los Excel: {e}")
+            return False
+
+        estado = EstadoTarifas()
+        estado.data_tarifarios = snapshot['data_tarifarios']
+        estado.data_grupos = snapshot['data_grupos']
+        estado.data_zonas = snapshot['data_zonas']
+        estado.indices_tarifarios = snapshot['indices_tarifarios']
+        estado.indices_grupos = snapshot['indices_grupos']
+        estado.firmas = {ruta: firma_archivo(ruta) for ruta in self.rutas}
+        self.campanas.sembrar(snapshot['campanas'])
+        self.hash_datos = snapshot['hash']
+        self._publicar(estado)
+        return True
+
+    def _indice_tarifario(self, aseguradora, estado=None):
+        estado = estado or self._estado
+        df = estado.data_tarifarios.get(aseguradora)
+        if df is None: return None
+        indice = estado.indices_tarifarios.get(aseguradora)
+        # Si alguien reemplazó el DataFrame por fuera de cargar_datos, recompilamos
+        if indice is None or indice.df is not df:
+            indice = IndiceTarifario(self, df)
+            estado.indices_tarifarios[aseguradora] = indice
+        return indice
+
+    def _indice_grupos(self, aseguradora, estado=None):
+        estado = estado or self._estado
+        df_g = estado.data_grupos.get(aseguradora)
+        if df_g is None: return None
+        indice = estado.indices_grupos.get(aseguradora)
+        if indice is None or indice.df is not df_g:
+            indice = IndiceGrupos(self, df_g)
+            estado.indices_grupos[aseguradora] = indice
+        return indice
+
     def obtener_clases_vehiculo(self):
+        """Clases de vehículo que aparecen en tarifarios y catálogos (tupla ordenada).
+        Se calcula una vez por versión de datos y queda guardada en el estado."""
+        estado = self._estado
+        if estado.clases is not None: return estado.clases
         clases_encontradas = set()
-        palabras_ignorar = ['TODOS', 'GENERAL', 'NAN', '0', '']
-        dfs = list(self.data_tarifarios.values()) + list(self.data_grupos.values())
+        palabras_ignorar = {'TODOS', 'GENERAL', 'NAN', '0', ''}
+        dfs = list(estado.data_tarifarios.values()) + list(estado.data_grupos.values())
         for df in dfs:
             if df is None: continue
             c_clase = self._buscar_columna(df, ['CLASE', 'TIPO', 'VEHICULO'])
@@ -115,28 +1089,51 @@ class SoatQuotator:
                         i_norm = self._normalizar(i)
                         if i_norm not in palabras_ignorar and len(i_norm) > 1:
                             clases_encontradas.add(i_norm)
-        return sorted(list(clases_encontradas))
+        estado.clases = tuple(sorted(clases_encontradas))
+        return estado.clases
 
     def obtener_catalogo_vehiculos(self):
+        """Marca -> tupla ordenada de modelos, de solo lectura. Se calcula una vez por versión de
+        datos (Streamlit lo pide en cada rerun) y queda guardado en el estado."""
+        estado = self._estado
+        if estado.catalogo is not None: return estado.catalogo
         catalogo = {}
-        dfs = list(self.data_grupos.values())
+        dfs = list(estado.data_grupos.values())
         for df in dfs:
             if df is None: continue
             c_marca = self._buscar_columna(df, ['MARCA'])
             c_modelo = self._buscar_columna(df, ['MODELO', 'MODELOS'])
             if c_marca and c_modelo:
-                for _, row in df.iterrows():
-                    m = self._normalizar(row[c_marca])
-                    mod = self._normalizar(row[c_modelo])
+                for marca, modelo in zip(df[c_marca].tolist(), df[c_modelo].tolist()):
+                    m = self._normalizar(marca)
+                    mod = self._normalizar(modelo)
                     if m not in ['NAN', 'TODAS', ''] and mod not in ['NAN', 'TODOS', '']:
-                        if m not in catalogo: catalogo[m] = []
-                        items = [x.strip() for x in mod.replace('/', ',').split(',')]
-                        for i in items:
-                            if i and i not in catalogo[m]: catalogo[m].append(i)
-        for m in catalogo: catalogo[m] = sorted(list(set(catalogo[m])))
-        return dict(sorted(catalogo.items()))
+                        modelos = catalogo.setdefault(m, set())
+                        for i in mod.replace('/', ',').split(','):
+                            i = i.strip()
+                            if i: modelos.add(i)
+        estado.catalogo = MappingProxyType({m: tuple(sorted(catalogo[m])) for m in sorted(catalogo)})
+        return estado.catalogo
+
+    def precalentar_sugerencias(self):
+        """Arma (si falta) el índice de sugerencias de la versión de datos actual y lo devuelve.
+        Conviene llamarlo al arrancar para que la primera consulta no pague su construcción."""
+        estado = self._estado
+        indice = estado.sugerencias
+        if indice is None:
+            indice = IndiceSugerencias(self.obtener_catalogo_vehiculos())
+            if estado is self._estado: estado.sugerencias = indice
+        return indice
+
+    def sugerir(self, q, marca=None, limite=10):
+        """Sugerencias de marca/modelo para texto libre (con errores de tipeo), para resolverlas
+        antes de cotizar. El índice se arma una vez por versión de datos."""
+        indice = self.precalentar_sugerencias()
+        return indice.sugerir(self._normalizar(q), self._normalizar(marca) if marca else None, limite)
 
     def _check_clase(self, val_excel, val_user):
+        # Versión original de una sola celda. Los índices usan coincide_clase / TablaClases; esta se
+        # deja tal cual (sin llamarlas) para que los tests las comparen contra algo independiente
         txt = self._normalizar(val_excel)
         usr = self._normalizar(val_user)
         if txt == usr: return True
@@ -169,74 +1166,53 @@ class SoatQuotator:
             if nums: return usr <= nums[0]
         return False
 
+    def _compilar_asientos(self, val_excel):
+        """Convierte la celda de ASIENTOS en un intervalo (min, max) equivalente a _check_asientos.
+        Devuelve None si la celda no acepta ningún número de asientos."""
+        txt = self._normalizar(val_excel)
+        inf = float('inf')
+        if txt in ['TODOS', 'GENERAL', 'NAN', '']: return (-inf, inf)
+        try:
+            if str(int(txt)) == txt: return (int(txt), int(txt))
+        except ValueError: pass
+        if '-' in txt:
+            try:
+                a, b = map(int, txt.split('-'))
+                return (a, b)
+            except: pass
+        if 'HASTA' in txt:
+            nums = [int(s) for s in re.findall(r'\d+', txt)]
+            if nums: return (-inf, nums[0])
+        return None
+
     # --- NUEVA LÓGICA DE DETECCIÓN INTELIGENTE ---
-    def _detectar_grupo(self, aseguradora, marca, modelo, clase, uso_usuario):
-        df_g = self.data_grupos.get(aseguradora)
-        if df_g is None: return "GENERAL"
-        
-        c_mar = self._buscar_columna(df_g, ['MARCA'])
-        c_mod = self._buscar_columna(df_g, ['MODELO', 'MODELOS'])
-        c_grp = self._buscar_columna(df_g, ['GRUPO', 'SEGMENTO'])
-        c_cla = self._buscar_columna(df_g, ['CLASE', 'TIPO', 'VEHICULO'])
-        c_uso = self._buscar_columna(df_g, ['USO']) # Importante leer el uso del catálogo
-        
-        if not (c_mar and c_mod and c_grp): return "GENERAL"
-        
-        u_mar = self._normalizar(marca)
-        u_mod = self._normalizar(modelo)
-        u_uso = self._normalizar(uso_usuario)
-        
-        mejor_grupo = "GENERAL"
-        encontro_exacto = False
-        
-        for _, row in df_g.iterrows():
-            r_mar = self._normalizar(row[c_mar])
-            r_mod = self._normalizar(row[c_mod])
-            
-            # 1. Coincidencia de Marca y Modelo
-            match_modelo = False
-            if r_mar == u_mar:
-                lista_modelos = [x.strip() for x in r_mod.replace('/', ',').split(',')]
-                if u_mod in lista_modelos: match_modelo = True
-                elif "TODOS" in r_mod: match_modelo = True
-            
-            if not match_modelo: continue
-
-            # 2. Validación de Clase (Si existe en catálogo)
-            if c_cla:
-                if not self._check_clase(row[c_cla], clase): continue
-
-            # 3. LÓGICA CLAVE: Validación de USO
-            # Si el catálogo especifica un uso, debemos ver si coincide con el del usuario.
-            # Si coincide -> Es un grupo especial.
-            # Si NO coincide -> Ignoramos este grupo (y el sistema usará "GENERAL" al final).
-            if c_uso:
-                r_uso = self._normalizar(row[c_uso])
-                # Chequeamos si el uso del usuario está permitido en esta fila
-                # Ej: Usuario "TAXI", Fila "PARTICULAR" -> No coinciden -> Ignorar fila
-                # Ej: Usuario "PARTICULAR", Fila "PARTICULAR" -> Coinciden -> Usar Grupo
-                
-                # Soportamos listas en el excel (Ej: "PARTICULAR, TAXI")
-                usos_fila = [x.strip() for x in re.split(r'[,/]', r_uso)]
-                match_uso = False
-                if u_uso in usos_fila: match_uso = True
-                else:
-                    # Match parcial
-                    for u in usos_fila:
-                        if u in u_uso: match_uso = True; break
-                
-                if not match_uso: continue
-
-            # Si llegamos aquí, es porque Marca, Modelo, Clase y USO coinciden.
-            raw_grp = str(row[c_grp]).upper()
-            if raw_grp.endswith('.0'): raw_grp = raw_grp[:-2]
-            mejor_grupo = raw_grp
-            encontro_exacto = True
-            break # Encontramos el grupo específico para este uso
-                
-        return mejor_grupo
+    def _detectar_grupo(self, aseguradora, marca, modelo, clase, uso_usuario, estado=None):
+        # Marca y modelo se resuelven en el índice; luego se valida clase y USO fila por fila.
+        # Si el catálogo especifica un uso que no coincide con el del usuario, esa fila se
+        # ignora y el sistema usará "GENERAL".
+        indice = self._indice_grupos(aseguradora, estado)
+        if indice is None: return "GENERAL"
+        return indice.detectar(self._normalizar(marca), self._normalizar(modelo), clase, self._normalizar(uso_usuario))
+
+    def _columna_precio(self, aseguradora, indice, dep_norm, estado=None):
+        """Columna de precio ya resuelta para el departamento. Las de DEPARTAMENTOS se calculan al
+        compilar el índice y quedan guardadas; cualquier otro texto se resuelve en cada pedido."""
+        col = indice.columnas_precio.get(dep_norm)
+        if col is None:
+            data_zonas = (estado or self._estado).data_zonas
+            col = self._detectar_columna_precio(aseguradora, dep_norm, indice.columnas, data_zonas)
+            if dep_norm in DEPARTAMENTOS: indice.columnas_precio[dep_norm] = col
+        return col
 
-    def _detectar_columna_precio(self, aseguradora, departamento, columnas_tarifario):
+    def tabla_columnas_precio(self):
+        """Tabla departamento x aseguradora con la columna de precio que usa cada cotización."""
+        tabla = {}
+        estado = self._estado
+        for nombre, indice in estado.indices_tarifarios.items():
+            tabla[nombre] = {dep: self._columna_precio(nombre, indice, dep, estado) for dep in DEPARTAMENTOS}
+        return pd.DataFrame(tabla)
+
+    def _detectar_columna_precio(self, aseguradora, departamento, columnas_tarifario, data_zonas=None):
         dep_norm = self._normalizar(departamento)
         match = get_close_matches(dep_norm, columnas_tarifario, n=1, cutoff=0.85)
         if match: return match[0]
@@ -247,7 +1223,7 @@ class SoatQuotator:
             match_alt = get_close_matches(alt, columnas_tarifario, n=1, cutoff=0.85)
             if match_alt: return match_alt[0]
 
-        df_z = self.data_zonas.get(aseguradora)
+        df_z = (self.data_zonas if data_zonas is None else data_zonas).get(aseguradora)
         if df_z is not None:
             c_dep = self._buscar_columna(df_z, ['DEPARTAMENTO', 'REGION', 'LUGAR', 'CIRCULACION'])
             c_zona = self._buscar_columna(df_z, ['ZONA', 'RIESGO', 'NOMBRE_ZONA', 'ZONAS'])
@@ -263,196 +1239,228 @@ class SoatQuotator:
             if col in columnas_tarifario: return col
         return "PRECIO"
 
-    def _buscar_campana_activa(self, aseguradora, departamento, uso, clase, modelo_user):
+    def _buscar_campana_activa(self, aseguradora, departamento, uso, clase, modelo_user, momento=None, indice=None):
+        return self.campanas.activa(aseguradora, departamento, uso, clase, modelo_user, momento, indice)
+
+    def cotizar(self, departamento, uso, clase, asientos, marca, modelo):
+        m = self.metricas
+        if m: inicio = t = time.perf_counter()
+        campanas = self.campanas.indice()
+        if m: m.medir('campanas', "", t)
+        hoy = pd.Timestamp.now()
+        resultado = pd.DataFrame(self._cotizar_cacheado(departamento, uso, clase, asientos, marca, modelo, campanas, hoy))
+        if m:
+            m.medir('cotizar', "", inicio)
+            m.contar('cotizaciones')
+        return resultado
+
+    def estadisticas_cache(self):
+        return self.cache.estadisticas()
+
+    def _cotizar_cacheado(self, departamento, uso, clase, asientos, marca, modelo, campanas, hoy, estado=None, preseleccion=None):
         try:
-            df_c = None
-            if os.path.exists('campanas.xlsx'):
-                try: df_c = pd.read_excel('campanas.xlsx')
-                except: pass
-            if df_c is None and os.path.exists('campanas.csv'):
-                try: df_c = pd.read_csv('campanas.csv', encoding='latin-1', sep=None, engine='python')
-                except: pass
-            
-            if df_c is None: return None, None
-            
-            df_c.columns = [self._normalizar(c) for c in df_c.columns]
-            
-            c_aseg = self._buscar_columna(df_c, ['ASEGURADORA', 'COMPAÑIA'])
-            c_dep = self._buscar_columna(df_c, ['DEPARTAMENTO', 'REGION'])
-            c_uso = self._buscar_columna(df_c, ['USO'])
-            c_clase = self._buscar_columna(df_c, ['CLASE', 'TIPO'])
-            c_precio = self._buscar_columna(df_c, ['PRECIO', 'COSTO'])
-            c_inicio = self._buscar_columna(df_c, ['INICIO', 'DESDE'])
-            c_fin = self._buscar_columna(df_c, ['FIN', 'HASTA'])
-            c_nombre = self._buscar_columna(df_c, ['NOMBRE', 'CAMPAÑA'])
-            c_modelos_campana = self._buscar_columna(df_c, ['MODELOS', 'MODELO'])
+            clave = (self._normalizar(departamento), self._normalizar(uso), self._normalizar(clase),
+                     int(asientos), self._normalizar(marca), self._normalizar(modelo))
+        except (TypeError, ValueError):
+            return self._cotizar_registros(departamento, uso, clase, asientos, marca, modelo, campanas, hoy)
 
-            if not (c_aseg and c_uso and c_clase and c_precio and c_dep): return None, None
+        if estado is None: estado = self._estado
+        generacion = (estado.version, self.campanas.version)
+        if self.cache.generacion != generacion: self.cache.limpiar(generacion)
 
-            for col in [c_aseg, c_dep, c_uso, c_clase]:
-                df_c[col] = df_c[col].apply(self._normalizar)
-            
-            def parse_fechas(serie):
-                for fmt in ['%d/%m/%Y', '%Y-%m-%d', '%m/%d/%Y', '%d-%m-%Y']:
-                    try: return pd.to_datetime(serie, format=fmt)
-                    except: continue
-                return pd.to_datetime(serie, errors='coerce')
-
-            df_c[c_inicio] = parse_fechas(df_c[c_inicio])
-            df_c[c_fin] = parse_fechas(df_c[c_fin])
-            
-            hoy = pd.Timestamp.now()
-            
-            u_aseg = self._normalizar(aseguradora)
-            u_dep = self._normalizar(departamento)
-            u_uso = self._normalizar(uso)
-            u_cla = self._normalizar(clase)
-            u_mod = self._normalizar(modelo_user)
-            
-            filtro = df_c[
-                (df_c[c_aseg] == u_aseg) &
-                (df_c[c_uso] == u_uso) &
-                ((df_c[c_dep] == u_dep) | (df_c[c_dep].isin(['TODOS', 'TODAS']))) &
-                (df_c[c_inicio] <= hoy) &
-                (df_c[c_fin] >= hoy)
-            ]
-            
-            for _, row in filtro.iterrows():
-                list_clases = [x.strip() for x in re.split(r'[,/]', str(row[c_clase]))]
-                match_clase = False
-                if u_cla in list_clases: match_clase = True
-                else:
-                    for item in list_clases:
-                        if self._check_clase(item, u_cla):
-                            match_clase = True
-                            break
-                
-                if not match_clase: continue
+        # La generación va en la clave: un resultado calculado con datos viejos nunca se sirve
+        clave = generacion + clave
+        registros = self.cache.obtener(clave, hoy)
+        if registros is None:
+            registros = self._cotizar_registros(*clave[2:], campanas=campanas, hoy=hoy, estado=estado, preseleccion=preseleccion)
+            self.cache.guardar(clave, registros, self.campanas.proxima_frontera(hoy))
+        return registros
 
-                if c_modelos_campana:
-                    modelos_campana = self._normalizar(row[c_modelos_campana])
-                    if modelos_campana not in ['TODOS', 'TODAS', 'GENERAL', '', 'NAN']:
-                        lista_modelos_ok = [x.strip() for x in re.split(r'[,/]', modelos_campana)]
-                        if u_mod not in lista_modelos_ok:
-                            continue
-
-                raw_precio = str(row[c_precio])
-                clean_precio = re.sub(r'[^\d.]', '', raw_precio)
-                if clean_precio:
-                    nombre = row[c_nombre] if c_nombre and pd.notna(row[c_nombre]) else "Oferta Especial"
-                    return float(clean_precio), nombre
-
-        except Exception:
-            pass
-        return None, None
+    def cotizar_lote(self, vehiculos):
+        """Cotiza una flota completa en una sola pasada.
 
-    def cotizar(self, departamento, uso, clase, asientos, marca, modelo):
-        resultados = []
+        vehiculos: DataFrame o lista de dicts con las columnas de COLUMNAS_VEHICULO (placa es opcional).
+        Los vehículos con los mismos datos normalizados se cotizan una sola vez y todos comparten la
+        misma foto de campañas. Devuelve un DataFrame con una fila por vehículo y aseguradora; la
+        columna 'Vehiculo' es la posición del vehículo en la entrada.
+        """
+        m = self.metricas
+        if m: inicio = time.perf_counter()
+        df_v = vehiculos if isinstance(vehiculos, pd.DataFrame) else pd.DataFrame(list(vehiculos))
+        df_v = df_v.reset_index(drop=True)
+        faltantes = [c for c in COLUMNAS_VEHICULO if c not in df_v.columns]
+        if faltantes: raise ValueError(f"Faltan columnas en el lote: {', '.join(faltantes)}")
+
+        columnas = {c: df_v[c].map(self._normalizar).tolist() for c in COLUMNAS_VEHICULO if c != 'asientos'}
+        columnas['asientos'] = df_v['asientos'].astype(int).tolist()
+        unicas = {}
+        codigos = [unicas.setdefault(clave, len(unicas)) for clave in zip(*(columnas[c] for c in COLUMNAS_VEHICULO))]
+
+        campanas = self.campanas.indice()
+        hoy = pd.Timestamp.now()
+        estado = self._estado
+        preseleccion = self._preseleccionar_lote(list(unicas), estado) if self.puntaje_vectorizado else None
+        por_clave = [self._cotizar_cacheado(*clave, campanas, hoy, estado, preseleccion) for clave in unicas]
+
+        placas = df_v['placa'].tolist() if 'placa' in df_v.columns else None
+        filas = []
+        for i, codigo in enumerate(codigos):
+            for registro in por_clave[codigo]:
+                fila = {"Vehiculo": i}
+                if placas is not None: fila["Placa"] = placas[i]
+                fila.update(registro)
+                filas.append(fila)
+        if m:
+            m.medir('cotizar_lote', "", inicio)
+            m.contar('vehiculos_lote', valor=len(codigos))
+        return pd.DataFrame(filas)
+
+    def _preseleccionar_lote(self, claves, estado):
+        """Con puntaje_vectorizado: elige de una sola vez, por aseguradora, la mejor fila del tarifario
+        para todos los vehículos del lote (una matriz vehículos × filas)."""
+        preseleccion = {}
+        for aseguradora in ASEGURADORAS:
+            indice = self._indice_tarifario(aseguradora, estado)
+            if indice is None or not indice.c_uso: continue
+            consultas = [(u_uso, u_clase, self._detectar_grupo(aseguradora, u_mar, u_mod, u_clase, u_uso, estado), asientos)
+                         for _, u_uso, u_clase, asientos, u_mar, u_mod in claves]
+            for consulta, fila in zip(consultas, indice.mejores_filas(consultas)):
+                preseleccion[(aseguradora,) + consulta] = fila
+        return preseleccion
+
+    def _cotizar_registros(self, departamento, uso, clase, asientos, marca, modelo, campanas=None, hoy=None, estado=None, preseleccion=None):
+        # Todas las aseguradoras se cotizan con la misma foto de datos aunque haya una recarga en curso
+        if estado is None: estado = self._estado
         u_dep = self._normalizar(departamento)
         u_uso = self._normalizar(uso)
         u_clase = self._normalizar(clase)
         u_mar = self._normalizar(marca)
         u_mod = self._normalizar(modelo)
+
+        # Una sola foto de campañas y un solo "ahora" para las cinco aseguradoras
+        if campanas is None: campanas = self.campanas.indice()
+        if hoy is None: hoy = pd.Timestamp.now()
         
-        for aseguradora in ['Rimac', 'La Positiva', 'Pacífico', 'Protecta', 'Mapfre']:
-            df = self.data_tarifarios.get(aseguradora)
-            if df is None: continue
-            
-            c_uso = self._buscar_columna(df, ['USO'])
-            c_clase = self._buscar_columna(df, ['CLASE', 'TIPO', 'VEHICULO', 'CATEGORIA'])
-            c_asientos = self._buscar_columna(df, ['ASIENTOS'])
-            c_grupo = self._buscar_columna(df, ['GRUPO', 'SEGMENTO'])
-            c_obs = self._buscar_columna(df, ['OBSERVACIONES', 'NOTAS'])
-            c_comision = self._buscar_columna(df, ['COMISION', '%'])
-            
-            # --- DETECCIÓN DE GRUPO CON USO ---
-            # Pasamos u_uso para que sepa si buscar en Particular o ignorar
-            grupo_target = self._detectar_grupo(aseguradora, u_mar, u_mod, u_clase, u_uso)
-            
-            col_precio_target = self._detectar_columna_precio(aseguradora, u_dep, df.columns.tolist())
-            
-            mejor_score = -1
-            mejor_fila = None
-            
-            if not c_uso: continue
-
-            for idx, row in df.iterrows():
-                score = 0
-                r_uso = self._normalizar(row[c_uso])
-                
-                # Match de Uso
-                if u_uso == r_uso: score += 1000
-                elif u_uso in r_uso: score += 800
-                else: continue # Si el uso no coincide, no sirve esta tarifa
-                
-                # Match de Clase
-                if c_clase:
-                    if self._check_clase(row[c_clase], u_clase): score += 500
-                    else: continue
-                
-                # Match de Grupo
-                if c_grupo:
-                    r_grp = str(row[c_grupo]).upper()
-                    # 1. Match Exacto (Ej: Target=3, Row=3)
-                    if r_grp == grupo_target: 
-                        score += 500
-                    # 2. Match Genérico (Ej: Target=GENERAL, Row=TODOS)
-                    elif r_grp in ['GENERAL', 'TODOS', 'RESTO', ''] and grupo_target == 'GENERAL': 
-                        score += 100
-                    # 3. Match Numérico
-                    elif r_grp.isdigit() and str(grupo_target).isdigit() and int(r_grp) == int(grupo_target): 
-                        score += 500
-                    else: 
-                        continue 
-                
-                # Match Asientos
-                if c_asientos:
-                    if self._check_asientos(row[c_asientos], asientos): score += 200
-                    else: continue
+        args = (u_dep, u_uso, u_clase, u_mar, u_mod, uso, clase, asientos, campanas, hoy)
+        if self.modo_paralelo is None:
+            resultados = [self._cotizar_aseguradora(aseguradora, *args, estado, preseleccion) for aseguradora in ASEGURADORAS]
+        else:
+            resultados = self._cotizar_en_paralelo(args, estado, preseleccion)
+        return [r for r in resultados if r is not None]
 
-                if score > mejor_score:
-                    mejor_score = score
-                    mejor_fila = row
-            
-            precio_lista = "Consultar"
-            precio_final = "Consultar"
-            obs = ""
-            comision_pct = 0.15
-            tiene_campana = False
-            
-            if mejor_fila is not None:
-                if col_precio_target in mejor_fila:
-                    val = mejor_fila[col_precio_target]
-                    if pd.notna(val):
-                        try: 
-                            p = float(str(val).replace(',',''))
-                            precio_lista = p
-                            precio_final = p
-                        except: pass
-                
-                if c_comision and pd.notna(mejor_fila[c_comision]):
-                    try: comision_pct = float(mejor_fila[c_comision])
+    def _ejecutor_paralelo(self):
+        """(ejecutor, evento): con 'procesos' el evento se activa cuando algún proceso ya cargó las tarifas."""
+        with self._lock_ejecutor:
+            if self._ejecutor is None:
+                listo = self._ejecutor_listo = threading.Event()
+                if self.modo_paralelo == 'procesos':
+                    self._ejecutor = ProcessPoolExecutor(max_workers=len(ASEGURADORAS), mp_context=multiprocessing.get_context('forkserver'),
+                                                         initializer=_iniciar_proceso, initargs=(self.rutas, self.ruta_snapshot))
+                    def _al_terminar(futuro):
+                        if not futuro.cancelled() and futuro.exception() is None: listo.set()
+                    for _ in ASEGURADORAS: self._ejecutor.submit(_proceso_listo).add_done_callback(_al_terminar)
+                else:
+                    self._ejecutor = ThreadPoolExecutor(max_workers=len(ASEGURADORAS), thread_name_prefix="aseguradora")
+                    listo.set()
+            return self._ejecutor, self._ejecutor_listo
+
+    def _cerrar_ejecutor(self):
+        with self._lock_ejecutor:
+            ejecutor, self._ejecutor = self._ejecutor, None
+        if ejecutor is not None: ejecutor.shutdown(wait=False)
+
+    def _cotizar_en_paralelo(self, args, estado, preseleccion=None):
+        """Cotiza las aseguradoras a la vez y devuelve los resultados en el orden de ASEGURADORAS."""
+        ejecutor, listo = self._ejecutor_paralelo()
+        aqui = lambda aseguradora: self._cotizar_aseguradora(aseguradora, *args, estado, preseleccion)
+        # Mientras los procesos cargan las tarifas (o si no pudieron arrancar, o si hay tablas asignadas
+        # a mano que ellos no tienen) se cotiza aquí mismo
+        if not listo.is_set() or (self.modo_paralelo == 'procesos' and estado.editado): return [aqui(aseguradora) for aseguradora in ASEGURADORAS]
+        try:
+            if self.modo_paralelo == 'procesos':
+                futuros = [ejecutor.submit(_cotizar_aseguradora_en_proceso, estado.firmas, aseguradora, args) for aseguradora in ASEGURADORAS]
+            else:
+                futuros = [ejecutor.submit(self._cotizar_aseguradora, aseguradora, *args, estado, preseleccion) for aseguradora in ASEGURADORAS]
+        except RuntimeError:
+            # Pool cerrado por una recarga o caído
+            return [aqui(aseguradora) for aseguradora in ASEGURADORAS]
+
+        limite = time.monotonic() + TIMEOUT_PARALELO
+        resultados = []
+        for aseguradora, futuro in zip(ASEGURADORAS, futuros):
+            try: resultados.append(futuro.result(timeout=max(0, limite - time.monotonic())))
+            except Exception:
+                # Proceso con datos de otros archivos, que no respondió a tiempo o pool caído: se cotiza aquí mismo
+                futuro.cancel()
+                resultados.append(aqui(aseguradora))
+        return resultados
+
+    def _cotizar_aseguradora(self, aseguradora, u_dep, u_uso, u_clase, u_mar, u_mod, uso, clase, asientos, campanas, hoy, estado, preseleccion=None):
+        indice = self._indice_tarifario(aseguradora, estado)
+        if indice is None: return None
+        m = self.metricas
+        if m: t = time.perf_counter()
+        
+        # --- DETECCIÓN DE GRUPO CON USO ---
+        # Pasamos u_uso para que sepa si buscar en Particular o ignorar
+        grupo_target = self._detectar_grupo(aseguradora, u_mar, u_mod, u_clase, u_uso, estado)
+        if m: t = m.medir('grupo', aseguradora, t)
+        
+        col_precio_target = self._columna_precio(aseguradora, indice, u_dep, estado)
+        if m: t = m.medir('columna_precio', aseguradora, t)
+        
+        if not indice.c_uso: return None
+
+        # Puntaje: +1000 uso exacto / +800 parcial, +500 clase, +500/+100 grupo, +200 asientos
+        consulta = (aseguradora, u_uso, u_clase, grupo_target, asientos)
+        if preseleccion is not None and consulta in preseleccion: mejor_fila = preseleccion[consulta]
+        elif self.puntaje_vectorizado: mejor_fila = indice.mejores_filas([consulta[1:]])[0]
+        else: mejor_fila = indice.mejor_fila(u_uso, u_clase, grupo_target, asientos)
+        if m:
+            t = m.medir('tarifario', aseguradora, t)
+            m.contar('filas_evaluadas', aseguradora, len(indice.filas) if self.puntaje_vectorizado else len(indice.candidatos(u_uso, u_clase)))
+        c_obs = indice.c_obs
+        c_comision = indice.c_comision
+        
+        precio_lista = "Consultar"
+        precio_final = "Consultar"
+        obs = ""
+        comision_pct = 0.15
+        tiene_campana = False
+        
+        if mejor_fila is not None:
+            if col_precio_target in mejor_fila:
+                val = mejor_fila[col_precio_target]
+                if pd.notna(val):
+                    try: 
+                        p = float(str(val).replace(',',''))
+                        precio_lista = p
+                        precio_final = p
                     except: pass
-                
-                if c_obs and pd.notna(mejor_fila[c_obs]):
-                    obs = str(mejor_fila[c_obs])
-
-            precio_promo, nombre_promo = self._buscar_campana_activa(aseguradora, u_dep, uso, clase, u_mod)
-            if precio_promo is not None:
-                precio_final = float(precio_promo)
-                obs_promo = f"🔥 {nombre_promo}"
-                obs = f"{obs} | {obs_promo}" if obs else obs_promo
-                tiene_campana = True
-
-            resultados.append({
-                "Aseguradora": aseguradora,
-                "Precio_Lista": precio_lista,
-                "Precio": precio_final,
-                "Tiene_Campaña": tiene_campana,
-                "Zona": col_precio_target,
-                "Grupo": grupo_target,
-                "Observaciones": obs,
-                "Comision_pct": comision_pct
-            })
             
-        return pd.DataFrame(resultados)
\ No newline at end of file
+            if c_comision and pd.notna(mejor_fila[c_comision]):
+                try: comision_pct = float(mejor_fila[c_comision])
+                except: pass
+            
+            if c_obs and pd.notna(mejor_fila[c_obs]):
+                obs = str(mejor_fila[c_obs])
+
+        if m: t = time.perf_counter()
+        precio_promo, nombre_promo = self._buscar_campana_activa(aseguradora, u_dep, uso, clase, u_mod, hoy, campanas)
+        if m: m.medir('campana', aseguradora, t)
+        if precio_promo is not None:
+            precio_final = float(precio_promo)
+            obs_promo = f"🔥 {nombre_promo}"
+            obs = f"{obs} | {obs_promo}" if obs else obs_promo
+            tiene_campana = True
+
+        return {
+            "Aseguradora": aseguradora,
+            "Precio_Lista": precio_lista,
+            "Precio": precio_final,
+            "Tiene_Campaña": tiene_campana,
+            "Zona": col_precio_target,
+            "Grupo": grupo_target,
+            "Observaciones": obs,
+            "Comision_pct": comision_pct
+        }
\ No newline at end of file
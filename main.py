@@ -1,20 +1,122 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
-from logica_cotizador import SoatQuotator
+import asyncio
+import functools
+import hmac
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from logica_cotizador import SoatQuotator, MetricasCotizador, COLUMNAS_VEHICULO, RUTA_SNAPSHOT
 
-app = FastAPI()
+@asynccontextmanager
+async def ciclo_vida(app):
+    # Si el panel de administración guarda un Excel, la API lo recarga sola sin reiniciar.
+    # Con servidor_multiproceso.py lo vigila el proceso padre (SOAT_VIGILAR=0 en los workers).
+    if os.environ.get("SOAT_VIGILAR", "1") != "0": motor.vigilar_cambios(intervalo=5)
+    yield
+
+app = FastAPI(lifespan=ciclo_vida)
 
 # Inicializamos el motor
-motor = SoatQuotator()
+# SOAT_MODO_PARALELO=hilos|procesos cotiza las cinco aseguradoras a la vez (experimental: hoy es más
+# lento que el modo por defecto, una tras otra; ver MODOS_PARALELO en logica_cotizador.py)
+# SOAT_PUNTAJE_VECTORIZADO=1 elige la fila del tarifario con NumPy (en lote, todos los vehículos juntos)
+# SOAT_METRICAS=0 apaga los tiempos por etapa que expone /metrics
+motor = SoatQuotator(modo_paralelo=os.environ.get("SOAT_MODO_PARALELO") or None,
+                     puntaje_vectorizado=os.environ.get("SOAT_PUNTAJE_VECTORIZADO") == "1",
+                     metricas=MetricasCotizador() if os.environ.get("SOAT_METRICAS", "1") != "0" else None)
 try:
-    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx')
+    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx', ruta_snapshot=RUTA_SNAPSHOT)
+    # Catálogo y clases quedan guardados en el motor (antes del fork si se usa servidor_multiproceso.py)
     motor.obtener_catalogo_vehiculos()
     motor.obtener_clases_vehiculo()
+    motor.precalentar_sugerencias()  # índice de /catalogo/sugerir
     print("✅ Motor de cotización cargado correctamente en la API.")
 except Exception as e:
     print(f"❌ Error al inicializar el motor en la API: {e}")
 
+class ColaLlena(Exception):
+    pass
+
+class PoolCotizador:
+    """Ejecuta el motor (pandas, CPU) en un pool de hilos acotado para no bloquear el event loop.
+
+    Acepta como máximo `max_pendientes` cotizaciones entre las que corren y las que esperan;
+    por encima de eso rechaza con ColaLlena (429). Cada cotización tiene `timeout` segundos.
+    """
+    def __init__(self, max_hilos, max_pendientes, timeout):
+        self.ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="cotizador")
+        self.max_hilos = max_hilos
+        self.max_pendientes = max_pendientes
+        self.timeout = timeout
+        self.pendientes = 0
+
+    def _liberar(self):
+        self.pendientes -= 1
+
+    def _al_terminar(self, loop):
+        def callback(_):
+            if not loop.is_closed(): loop.call_soon_threadsafe(self._liberar)
+        return callback
+
+    async def ejecutar(self, fn, *args, **kwargs):
+        if self.pendientes >= self.max_pendientes: raise ColaLlena()
+        loop = asyncio.get_running_loop()
+        self.pendientes += 1
+        futuro = self.ejecutor.submit(functools.partial(fn, *args, **kwargs))
+        # El cupo se libera cuando el hilo termina de verdad, aunque el cliente ya haya recibido el timeout
+        futuro.add_done_callback(self._al_terminar(loop))
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(futuro)), self.timeout)
+
+    def estado(self):
+        return {"hilos": self.max_hilos, "pendientes": self.pendientes, "max_pendientes": self.max_pendientes, "timeout": self.timeout}
+
+pool = PoolCotizador(
+    max_hilos=int(os.environ.get("SOAT_HILOS", 4)),
+    max_pendientes=int(os.environ.get("SOAT_MAX_PENDIENTES", 64)),
+    timeout=float(os.environ.get("SOAT_TIMEOUT", 10)),
+)
+
+@app.get("/estado")
+def estado_motor():
+    """Contadores del cache de cotizaciones (hits, misses, evictions) y ocupación del pool."""
+    return {"cache": motor.estadisticas_cache(), "pool": pool.estado()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricas():
+    """Métricas en formato Prometheus: tiempos por etapa y aseguradora, filas evaluadas, cache y pool."""
+    texto = motor.metricas.exportar(motor.estadisticas_cache()) if motor.metricas else ""
+    p = pool.estado()
+    texto += (f"# TYPE soat_pool_pendientes gauge\nsoat_pool_pendientes {p['pendientes']}\n"
+              f"# TYPE soat_pool_max_pendientes gauge\nsoat_pool_max_pendientes {p['max_pendientes']}\n"
+              f"# TYPE soat_datos_version gauge\nsoat_datos_version {motor.version_datos}\n")
+    return PlainTextResponse(texto, media_type="text/plain; version=0.0.4")
+
+@app.get("/catalogo/sugerir")
+def sugerir_vehiculo(q: str, marca: str = "", limite: int = 10):
+    """Sugerencias de marca/modelo para texto libre, para corregir errores de tipeo antes de cotizar.
+    Con marca solo sugiere modelos de esa marca."""
+    return {"q": q, "sugerencias": motor.sugerir(q, marca or None, max(1, min(limite, 50)))}
+
+# SOAT_TOKEN_ADMIN: token que piden los endpoints /admin (cabecera X-Admin-Token). Sin token
+# configurado solo se aceptan pedidos hechos desde la misma máquina (detrás de un proxy local hay
+# que configurar el token, porque todos los pedidos llegan desde 127.0.0.1).
+TOKEN_ADMIN = os.environ.get("SOAT_TOKEN_ADMIN", "")
+
+def es_admin(request):
+    if TOKEN_ADMIN: return hmac.compare_digest(request.headers.get("x-admin-token", ""), TOKEN_ADMIN)
+    return request.client is not None and request.client.host in ("127.0.0.1", "::1", "localhost")
+
+@app.post("/admin/recargar")
+def recargar_tarifas(request: Request):
+    """Fuerza la revisión de los tarifarios y recarga los que cambiaron."""
+    if not es_admin(request): return JSONResponse(status_code=403, content={"mensaje": "⚠️ No autorizado"})
+    return {"recargadas": motor.recargar()}
+
 class DatosSOAT(BaseModel):
     placa: str
     marca: str
@@ -30,7 +132,8 @@ async def cotizar_soat(datos: DatosSOAT):
         departamento_limpio = datos.departamento.upper().strip()
         uso_limpio = datos.uso.upper().strip()
 
-        df = motor.cotizar(
+        df = await pool.ejecutar(
+            motor.cotizar,
             departamento=departamento_limpio,
             uso=uso_limpio,
             clase=datos.clase,
@@ -72,9 +175,85 @@ async def cotizar_soat(datos: DatosSOAT):
             "botones": opciones_disponibles
         }
 
+    except ColaLlena:
+        return JSONResponse(status_code=429, content={
+            "mensaje": "⚠️ Estamos atendiendo muchas cotizaciones, intenta de nuevo en unos segundos.",
+            "link": "",
+            "botones": ["🙋‍♂️ Hablar con un asesor"]
+        })
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=504, content={
+            "mensaje": "⚠️ La cotización tardó demasiado, intenta de nuevo en unos segundos.",
+            "link": "",
+            "botones": ["🙋‍♂️ Hablar con un asesor"]
+        })
     except Exception as e:
         return {
             "mensaje": f"⚠️ Error al procesar: {str(e)}",
             "link": "",
             "botones": ["🙋‍♂️ Hablar con un asesor"]
         }
+
+
+TAMANO_BLOQUE_LOTE = 500
+ESPERA_COLA_LOTE = 0.05   # segundos entre reintentos cuando la cola está llena a mitad de un lote
+
+@app.post("/cotizar/lote")
+async def cotizar_lote(request: Request):
+    """Cotiza una flota. Acepta JSON (lista de vehículos con los campos de DatosSOAT, o {"vehiculos": [...]})
+    o CSV con esas mismas columnas. Responde en streaming: NDJSON si llegó JSON, CSV si llegó CSV."""
+    cuerpo = await request.body()
+    es_csv = 'csv' in request.headers.get('content-type', '')
+    try:
+        if es_csv:
+            df_v = pd.read_csv(io.BytesIO(cuerpo), dtype=str, keep_default_na=False)
+            df_v.columns = [str(c).strip().lower() for c in df_v.columns]
+        else:
+            datos = json.loads(cuerpo)
+            if isinstance(datos, dict): datos = datos.get('vehiculos', [])
+            df_v = pd.DataFrame([dict(DatosSOAT(**v)) for v in datos])
+
+        faltantes = [c for c in COLUMNAS_VEHICULO if c not in df_v.columns]
+        if faltantes: raise ValueError(f"faltan columnas {', '.join(faltantes)}")
+        if len(df_v):
+            # Se convierte aquí: un error dentro del streaming dejaría la respuesta cortada
+            asientos = pd.to_numeric(df_v['asientos'], errors='coerce')
+            if asientos.isna().any() or (asientos % 1 != 0).any(): raise ValueError("hay filas con asientos no enteros")
+            df_v['asientos'] = asientos.astype(int)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"mensaje": f"⚠️ Lote inválido: {str(e)}"})
+
+    # Cada bloque pasa por el mismo pool que /cotizar (límite de concurrencia y timeout). El primero se
+    # calcula antes de responder, así la cola llena o el timeout todavía pueden devolver 429 / 504.
+    bloques = range(0, len(df_v), TAMANO_BLOQUE_LOTE)
+    cotizar_bloque = lambda inicio: pool.ejecutar(motor.cotizar_lote, df_v.iloc[inicio:inicio + TAMANO_BLOQUE_LOTE])
+    try: primero = await cotizar_bloque(0) if len(df_v) else None
+    except ColaLlena:
+        return JSONResponse(status_code=429, content={"mensaje": "⚠️ Estamos atendiendo muchas cotizaciones, intenta de nuevo en unos segundos."})
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=504, content={"mensaje": "⚠️ La cotización tardó demasiado, intenta de nuevo en unos segundos."})
+
+    async def generar():
+        encabezado = True
+        for inicio in bloques:
+            if inicio == 0: res = primero
+            else:
+                # El lote ya fue aceptado: si la cola está llena se espera un cupo en vez de rechazarlo
+                while True:
+                    try: res = await cotizar_bloque(inicio); break
+                    except ColaLlena: await asyncio.sleep(ESPERA_COLA_LOTE)
+                    except asyncio.TimeoutError:
+                        # Ya se respondió 200: se avisa en el cuerpo y se corta la respuesta
+                        if not es_csv: yield json.dumps({"error": "timeout", "Vehiculo": inicio}, ensure_ascii=False) + "\n"
+                        return
+            if res.empty: continue
+            res['Vehiculo'] += inicio
+            if es_csv:
+                yield res.to_csv(index=False, header=encabezado)
+                encabezado = False
+            else:
+                for registro in res.to_dict('records'):
+                    yield json.dumps(registro, ensure_ascii=False) + "\n"
+
+    tipo = "text/csv" if es_csv else "application/x-ndjson"
+    return StreamingResponse(generar(), media_type=tipo)
\ No newline at end of file
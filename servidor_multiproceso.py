@@ -0,0 +1,151 @@
+"""Levanta la API con varios workers que comparten en memoria una sola copia de las tarifas.
+
+Uso: python servidor_multiproceso.py [workers] [puerto]
+     (o variables SOAT_WORKERS, SOAT_HOST, SOAT_PUERTO; por defecto un worker por núcleo)
+
+El proceso padre importa main.py (carga el snapshot / Excel y compila los índices una sola vez),
+congela esos objetos con gc.freeze() y recién ahí hace fork de los workers. Los DataFrames e
+índices quedan en páginas compartidas copy-on-write: los workers solo los leen, así que la
+memoria no crece al agregar workers y un worker nuevo arranca sin volver a leer nada.
+
+Los workers no vigilan los Excel (SOAT_VIGILAR=0). Lo hace el padre: si un tarifario cambió lo
+recarga, vuelve a congelar y reemplaza los workers uno por uno (cada uno termina lo que tenía en
+curso), así las tarifas nuevas también quedan compartidas. Si un worker muere, se levanta otro.
+"""
+import gc
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import uvicorn
+
+INTERVALO_VIGILANCIA = 5
+TIMEOUT_ARRANQUE = 30   # segundos que se espera a que un worker nuevo acepte conexiones
+
+class ServidorWorker(uvicorn.Server):
+    """uvicorn.Server que avisa por un pipe cuando ya está aceptando conexiones."""
+    def __init__(self, config, aviso):
+        super().__init__(config)
+        self.aviso = aviso
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        # Si nadie espera el aviso (arranque inicial o reemplazo de un worker caído) el pipe ya está cerrado
+        try:
+            if self.started: os.write(self.aviso, b"1")
+        except BrokenPipeError: pass
+        os.close(self.aviso)
+
+class ServidorMultiproceso:
+    def __init__(self, workers, host, puerto):
+        self.workers = workers
+        self.host = host
+        self.puerto = puerto
+        self.hijos = set()
+        self.reemplazados = set()
+        self.detenido = False
+
+    def _lanzar_worker(self):
+        """Hace fork de un worker y devuelve (pid, fd): el fd se puede leer cuando el worker ya está listo."""
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid:
+            os.close(escritura)
+            self.hijos.add(pid)
+            return pid, lectura
+        # Worker: uvicorn instala sus propios manejadores de señales
+        os.close(lectura)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(self.main.app, host=self.host, port=self.puerto, log_level="info")
+        try: ServidorWorker(config, escritura).run(sockets=[self.socket])
+        finally: os._exit(0)
+
+    @staticmethod
+    def _esperar_listo(fd, timeout):
+        """True si el worker avisó que está aceptando conexiones antes de `timeout` segundos."""
+        try:
+            listos, _, _ = select.select([fd], [], [], timeout)
+            return bool(listos) and os.read(fd, 1) == b"1"
+        finally:
+            os.close(fd)
+
+    def _detener(self, *_):
+        self.detenido = True
+        for pid in list(self.hijos):
+            try: os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    def _recoger_hijos(self):
+        while self.hijos:
+            try: pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError: self.hijos.clear(); return
+            if pid == 0: return
+            self.hijos.discard(pid)
+            if pid in self.reemplazados: self.reemplazados.discard(pid)
+            elif not self.detenido:
+                print(f"⚠️ Worker {pid} terminó inesperadamente, levantando otro")
+                os.close(self._lanzar_worker()[1])
+
+    def _reemplazar_workers(self):
+        # De a uno: el worker viejo recién se retira cuando el nuevo ya acepta conexiones, así nunca
+        # hay más de workers + 1 procesos ni un momento sin workers listos
+        for pid in list(self.hijos):
+            nuevo, listo = self._lanzar_worker()
+            if self._esperar_listo(listo, TIMEOUT_ARRANQUE): viejo = pid
+            else:
+                print(f"⚠️ El worker {nuevo} no arrancó a tiempo, se mantiene {pid}")
+                viejo = nuevo
+            self.reemplazados.add(viejo)
+            try: os.kill(viejo, signal.SIGTERM)
+            except ProcessLookupError: pass
+
+    def _recargar(self):
+        try: recargadas = self.main.motor.recargar()
+        except Exception as e:
+            print(f"Error vigilando tarifas: {e}")
+            recargadas = []
+        if not recargadas: return
+        # Se libera el estado anterior y el nuevo pasa a la generación permanente antes del fork
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+        self._reemplazar_workers()
+
+    def servir(self):
+        # Los workers heredan el motor ya cargado; que no arranquen su propio hilo de vigilancia
+        os.environ["SOAT_VIGILAR"] = "0"
+        import main
+        self.main = main
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((self.host, self.puerto))
+        self.socket.listen(2048)
+        self.socket.set_inheritable(True)
+
+        # Todo lo cargado hasta aquí pasa a la generación permanente: el GC no vuelve a tocar
+        # esas páginas en los workers y siguen compartidas con el padre
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._detener)
+        signal.signal(signal.SIGINT, self._detener)
+        for _ in range(self.workers): os.close(self._lanzar_worker()[1])
+        print(f"✅ {self.workers} workers escuchando en http://{self.host}:{self.puerto}")
+
+        proxima_revision = time.monotonic() + INTERVALO_VIGILANCIA
+        while self.hijos:
+            time.sleep(0.5)
+            self._recoger_hijos()
+            if not self.detenido and time.monotonic() >= proxima_revision:
+                self._recargar()
+                proxima_revision = time.monotonic() + INTERVALO_VIGILANCIA
+        self.socket.close()
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get("SOAT_WORKERS", os.cpu_count() or 1))
+    puerto = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.environ.get("SOAT_PUERTO", 8000))
+    ServidorMultiproceso(workers, os.environ.get("SOAT_HOST", "0.0.0.0"), puerto).servir()
\ No newline at end of file
@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from logica_cotizador import SoatQuotator
+
+ARCHIVOS = ('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx')
+
+@pytest.fixture(scope="session")
+def motor():
+    """Motor con los tarifarios que vienen en el repositorio (leídos de los Excel, sin snapshot)."""
+    motor = SoatQuotator(cache_max=0)
+    motor.cargar_datos(*(os.path.join(RAIZ, a) for a in ARCHIVOS))
+    return motor
\ No newline at end of file
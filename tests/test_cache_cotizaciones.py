@@ -0,0 +1,31 @@
+"""El cache de cotizar no devuelve precios viejos cuando cambian los datos del motor."""
+import pytest
+from logica_cotizador import SoatQuotator
+from conftest import RAIZ, ARCHIVOS
+
+VEHICULO = ("LIMA", "PARTICULAR", "AUTOMOVIL", 5, "TOYOTA", "YARIS")
+
+@pytest.fixture
+def motor_con_cache(monkeypatch):
+    monkeypatch.chdir(RAIZ)
+    motor = SoatQuotator(cache_max=100, cache_ttl=300)
+    motor.cargar_datos(*ARCHIVOS)
+    return motor
+
+def precio(df, aseguradora):
+    return df.set_index('Aseguradora').at[aseguradora, 'Precio_Lista']
+
+def test_cambiar_precio_por_el_setter(motor_con_cache):
+    motor = motor_con_cache
+    antes = motor.cotizar(*VEHICULO)
+    assert precio(motor.cotizar(*VEHICULO), 'Rimac') == precio(antes, 'Rimac')
+    assert motor.estadisticas_cache()['hits'] == 1
+
+    zona = antes.set_index('Aseguradora').at['Rimac', 'Zona']
+    df = motor.data_tarifarios['Rimac'].copy()
+    df[zona] = 999
+    motor.data_tarifarios = {**motor.data_tarifarios, 'Rimac': df}
+
+    assert precio(motor.cotizar(*VEHICULO), 'Rimac') == 999.0
+    assert motor.estadisticas_cache()['hits'] == 1
+    assert motor.version_datos == 2
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""cotizar contra los resultados del motor original (el que recorría el tarifario con iterrows),
+guardados en tests/datos/cotizaciones_base.json.gz para dos fechas: una con campañas activas y
+otra sin ninguna. Se revisan el índice, el puntaje vectorizado y cotizar_lote."""
+import gzip
+import json
+import os
+import pandas as pd
+import pytest
+from conftest import RAIZ
+
+with gzip.open(os.path.join(RAIZ, 'tests', 'datos', 'cotizaciones_base.json.gz'), 'rt', encoding='utf-8') as f:
+    BASE = json.load(f)   # fecha -> [{caso, columnas, tipos, filas}]
+
+@pytest.fixture
+def motor_en_fecha(motor, monkeypatch):
+    monkeypatch.chdir(RAIZ)   # campanas.xlsx se busca en el directorio actual
+    def fijar(fecha, puntaje_vectorizado=False):
+        monkeypatch.setattr(pd.Timestamp, 'now', classmethod(lambda cls, tz=None: pd.Timestamp(fecha)))
+        monkeypatch.setattr(motor, 'puntaje_vectorizado', puntaje_vectorizado)
+        return motor
+    return fijar
+
+@pytest.mark.parametrize("puntaje_vectorizado", [False, True])
+@pytest.mark.parametrize("fecha", sorted(BASE))
+def test_cotizar_igual_al_motor_original(motor_en_fecha, fecha, puntaje_vectorizado):
+    motor = motor_en_fecha(fecha, puntaje_vectorizado)
+    distintos = []
+    for esperado in BASE[fecha]:
+        df = motor.cotizar(*esperado['caso'])
+        if (list(df.columns) != esperado['columnas'] or [str(t) for t in df.dtypes] != esperado['tipos']
+                or df.to_dict('records') != esperado['filas']):
+            distintos.append(esperado['caso'])
+    assert not distintos, f"{len(distintos)} de {len(BASE[fecha])} casos distintos, p. ej. {distintos[:3]}"
+
+@pytest.mark.parametrize("puntaje_vectorizado", [False, True])
+@pytest.mark.parametrize("fecha", sorted(BASE))
+def test_cotizar_lote_igual_al_motor_original(motor_en_fecha, fecha, puntaje_vectorizado):
+    motor = motor_en_fecha(fecha, puntaje_vectorizado)
+    vehiculos = pd.DataFrame([e['caso'] for e in BASE[fecha]], columns=['departamento', 'uso', 'clase', 'asientos', 'marca', 'modelo'])
+    res = motor.cotizar_lote(vehiculos)
+    por_vehiculo = {i: df.drop(columns=['Vehiculo']).to_dict('records') for i, df in res.groupby('Vehiculo')}
+    distintos = [e['caso'] for i, e in enumerate(BASE[fecha]) if por_vehiculo.get(i, []) != e['filas']]
+    assert not distintos, f"{len(distintos)} de {len(BASE[fecha])} casos distintos, p. ej. {distintos[:3]}"
\ No newline at end of file
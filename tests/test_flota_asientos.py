@@ -0,0 +1,20 @@
+"""Las filas de flota con asientos que no son enteros finitos se marcan como error, no se truncan."""
+import pandas as pd
+from cotizacion_flota import cotizar_bloque
+from documentos_flota import cotizaciones_de_flota
+
+def bloque(*asientos):
+    return pd.DataFrame({'departamento': "LIMA", 'uso': "PARTICULAR", 'clase': "AUTOMOVIL",
+                         'asientos': list(asientos), 'marca': "TOYOTA", 'modelo': "YARIS"})
+
+def test_cotizar_bloque_marca_asientos_no_enteros(motor):
+    salida = cotizar_bloque(motor, bloque("5", "5.5", "inf", "-inf", "cinco", "", "5.0"))
+    errores = salida['Error'].tolist()
+    assert errores == ["", "asientos inválidos", "asientos inválidos", "asientos inválidos", "asientos inválidos", "asientos inválidos", ""]
+    assert salida.at[0, 'Mejor Precio'] != "" and salida.at[0, 'Mejor Precio'] == salida.at[6, 'Mejor Precio']
+    assert (salida.loc[1:5, 'Mejor Precio'] == "").all()
+
+def test_documentos_saltan_asientos_no_enteros(motor):
+    cotizaciones = list(cotizaciones_de_flota(motor, [bloque("5", "5.5", "inf", "4")], prefijo="T"))
+    assert [c['asientos'] for c in cotizaciones] == [5, 4]
+    assert [c['cotizacion_nro'] for c in cotizaciones] == ["T-0001", "T-0002"]
\ No newline at end of file
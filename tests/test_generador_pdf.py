@@ -0,0 +1,52 @@
+"""Regresión byte a byte del PDF de cotización contra documentos generados con el diseño actual
+(tests/datos/). Solo se ignora la fecha de creación que fpdf escribe en los metadatos."""
+import os
+import re
+from datetime import datetime
+import pandas as pd
+import pytest
+import generador_pdf
+from conftest import RAIZ
+
+DATOS = os.path.join(RAIZ, 'tests', 'datos')
+
+class FechaFija(datetime):
+    @classmethod
+    def now(cls, tz=None): return cls(2026, 3, 2, 10, 30)
+
+def resultados(*filas):
+    return pd.DataFrame([dict(zip(['Aseguradora', 'Precio_Lista', 'Precio', 'Tiene_Campaña'], f)) for f in filas],
+                        columns=['Aseguradora', 'Precio_Lista', 'Precio', 'Tiene_Campaña'])
+
+CASOS = {
+    "simple": dict(
+        cotizacion_nro="2000-0302-1030", cliente="JUAN PÉREZ", dni_ruc="45678912", celular="", email="juan@correo.pe",
+        placa="ABC123", marca="TOYOTA", modelo="YARIS", uso="PARTICULAR", clase="AUTOMOVIL", asientos=5, region="LIMA",
+        fecha_vencimiento="15/04/2026",
+        df_resultados=resultados(("Rimac", 75.0, 75.0, False), ("La Positiva", 80.5, 80.5, False), ("Mapfre", 92.0, 92.0, False))),
+    "campana": dict(
+        cotizacion_nro="2000-0302-1031", cliente="TRANSPORTES ANDINOS S.A.C. - FLOTA NORTE", dni_ruc="20123456789",
+        celular="987654321", email="flota@andinos.pe", placa="T4X-921", marca="HYUNDAI", modelo="ACCENT", uso="TAXI",
+        clase="AUTOMOVIL", asientos=5, region="CUSCO", fecha_vencimiento="01/05/2026",
+        df_resultados=resultados(("Pacífico", 140.0, 99.0, True), ("Rimac", 120.0, 120.0, False), ("Protecta", "Consultar", 110.0, True)),
+        campanas_activas_txt="Pacífico, Protecta"),
+    "sin_ofertas": dict(
+        cotizacion_nro="X", cliente="", dni_ruc="", celular="", email="", placa="", marca="", modelo="", uso="CARGA",
+        clase="CAMION", asientos=3, region="PIURA", fecha_vencimiento="", df_resultados=resultados()),
+}
+
+def sin_fecha_creacion(pdf_bytes):
+    return re.sub(rb"/CreationDate \(D:\d+\)", b"", pdf_bytes)
+
+@pytest.fixture
+def fecha_fija(monkeypatch):
+    # El PDF lleva la fecha de cotización y busca logo.png en el directorio actual
+    monkeypatch.setattr(generador_pdf, 'datetime', FechaFija)
+    monkeypatch.chdir(RAIZ)
+
+@pytest.mark.parametrize("nombre", CASOS)
+def test_pdf_identico_al_diseno_actual(fecha_fija, nombre):
+    with open(os.path.join(DATOS, f"cotizacion_{nombre}.pdf"), 'rb') as f: esperado = f.read()
+    # Dos veces: la segunda usa el logo ya decodificado
+    for _ in range(2):
+        assert sin_fecha_creacion(generador_pdf.crear_pdf(**CASOS[nombre])) == sin_fecha_creacion(esperado)
\ No newline at end of file
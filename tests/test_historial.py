@@ -0,0 +1,17 @@
+"""Las cotizaciones sin oferta (cia_min "-") no cuentan como una aseguradora más barata."""
+from historial import AlmacenHistorial, COLUMNAS_HISTORIAL
+
+def fila(cia, precio, campana="NO"):
+    f = [""] * len(COLUMNAS_HISTORIAL)
+    f[0], f[13], f[14], f[15] = "2026-10-01", cia, precio, campana
+    return f
+
+def test_participacion_solo_con_precio(tmp_path):
+    almacen = AlmacenHistorial(str(tmp_path / "historial.db"), None)
+    almacen.agregar([fila("Rimac", 80), fila("Rimac", 90, "SI"), fila("Mapfre", 70), fila("-", 0), fila("-", 0), fila("-", 0)])
+    df = almacen.participacion_mas_barata().set_index("aseguradora")
+    assert df.index.tolist() == ["Rimac", "Mapfre"]
+    assert df["veces"].tolist() == [2, 1]
+    assert df.at["Rimac", "precio_promedio"] == 85.0
+    assert df["participacion"].sum() == 1.0 and df.at["Mapfre", "participacion"] == 1 / 3
+    assert "-" not in almacen.conversion_campana()["aseguradora"].tolist()
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""IndiceTarifario.mejores_filas (NumPy) contra mejor_fila en el producto cartesiano completo de
+usos x clases x grupos x asientos de cada tarifario."""
+import itertools
+import pytest
+from logica_cotizador import ASEGURADORAS, CLASES_USUARIO, USOS_USUARIO
+
+ASIENTOS = list(range(0, 41)) + [60, 100]
+TAMANO_LOTE = 20000
+
+def producto_cartesiano(motor, indice):
+    # Valores del tarifario, del formulario, parciales y vacíos (caen en las reglas de "contiene")
+    usos = set(indice.usos) | set(USOS_USUARIO) | {u[:4] for u in indice.usos} | {''}
+    clases = ({motor._normalizar(c) for c in indice.clases} | set(motor.obtener_clases_vehiculo())
+              | set(CLASES_USUARIO) | {'STATION WAGON', 'XYZ', ''})
+    grupos = {g[0] for g in indice.grupos} | {'GENERAL', '1', '2', '3', '01', '02', '10', 'X'}
+    return list(itertools.product(sorted(usos), sorted(clases), sorted(grupos), ASIENTOS))
+
+@pytest.mark.parametrize("aseguradora", ASEGURADORAS)
+def test_mejores_filas_igual_a_mejor_fila(motor, aseguradora):
+    indice = motor.indices_tarifarios[aseguradora]
+    consultas = producto_cartesiano(motor, indice)
+    distintas = []
+    for inicio in range(0, len(consultas), TAMANO_LOTE):
+        lote = consultas[inicio:inicio + TAMANO_LOTE]
+        for consulta, fila in zip(lote, indice.mejores_filas(lote)):
+            if fila is not indice.mejor_fila(*consulta): distintas.append(consulta)
+    assert not distintas, f"{len(distintas)} de {len(consultas)} consultas distintas, p. ej. {distintas[:5]}"
+
+@pytest.mark.parametrize("uso, resultado", [("PARTICULAR", ValueError), ("ZZZ", None)])
+def test_asientos_no_numericos(motor, uso, resultado):
+    # Igual que mejor_fila: los asientos solo se convierten a int si queda alguna fila candidata
+    indice = motor.indices_tarifarios['Rimac']
+    consulta = (uso, 'AUTOMOVIL', 'GENERAL', 'abc')
+    if resultado is ValueError:
+        with pytest.raises(ValueError): indice.mejor_fila(*consulta)
+        with pytest.raises(ValueError): indice.mejores_filas([consulta])
+    else:
+        assert indice.mejor_fila(*consulta) is None
+        assert indice.mejores_filas([consulta]) == [None]
\ No newline at end of file
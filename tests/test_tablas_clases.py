@@ -0,0 +1,61 @@
+"""coincide_clase, TablaClases y los intervalos de asientos contra las reglas originales de una sola
+celda (_check_clase y _check_asientos, que no las usan), en todas las celdas de los Excel que
+vienen en el repositorio."""
+import pytest
+from logica_cotizador import CLASES_USUARIO, TablaClases, coincide_clase, normalizar
+from conftest import RAIZ
+
+# Además de las del formulario, clases que llegan libres por la API (se calculan sin guardarse)
+CLASES_LIBRES = ("STATION WAGON", "automovil", "Pick Up", "camioneta", "MOTO", "XYZ", "")
+ASIENTOS = range(0, 81)
+
+def sin_repetir(valores):
+    vistos = {}
+    for v in valores: vistos.setdefault(repr(v), v)
+    return list(vistos.values())
+
+@pytest.fixture(scope="module")
+def celdas_clase(motor):
+    celdas = []
+    for indice in motor.indices_tarifarios.values(): celdas += indice.clases
+    for indice in motor.indices_grupos.values(): celdas += [c for c in indice.clases if c is not None]
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(RAIZ)   # campanas.xlsx se busca en el directorio actual
+        for campanas in motor.campanas.indice().values():
+            for campana in campanas: celdas += campana['clases']
+    return sin_repetir(celdas)
+
+def test_hay_celdas(celdas_clase):
+    assert len(celdas_clase) > 20
+
+@pytest.mark.parametrize("clase", CLASES_USUARIO + CLASES_LIBRES)
+def test_coincide_clase_igual_a_check_clase(motor, celdas_clase, clase):
+    distintas = [celda for celda in celdas_clase if coincide_clase(normalizar(celda), normalizar(clase)) != motor._check_clase(celda, clase)]
+    assert not distintas
+
+@pytest.mark.parametrize("clase", CLASES_USUARIO + CLASES_LIBRES)
+def test_mascara_igual_a_check_clase(motor, celdas_clase, clase):
+    tabla = TablaClases(celdas_clase)
+    esperadas = [motor._check_clase(celda, clase) for celda in celdas_clase]
+    mascara = tabla.mascara(clase)
+    assert [bool(mascara >> i & 1) for i in range(len(celdas_clase))] == esperadas
+    assert tabla.aceptadas(clase).tolist() == esperadas
+
+def test_tablas_de_los_indices(motor):
+    for nombre, indice in list(motor.indices_tarifarios.items()) + list(motor.indices_grupos.items()):
+        if not indice.clases or indice.clases[0] is None: continue
+        codigos = list(indice._cod_clase)
+        for clase in CLASES_USUARIO + CLASES_LIBRES:
+            mascara = indice._reglas_clase.mascara(clase)
+            for celda, codigo in zip(indice.clases, codigos):
+                assert bool(mascara >> codigo & 1) == motor._check_clase(celda, clase), (nombre, celda, clase)
+
+def test_compilar_asientos_igual_a_check_asientos(motor):
+    celdas = sin_repetir(fila[indice.c_asientos] for indice in motor.indices_tarifarios.values() if indice.c_asientos
+                         for fila in indice.filas)
+    assert celdas
+    for celda in celdas:
+        rango = motor._compilar_asientos(celda)
+        for asientos in ASIENTOS:
+            dentro = rango is not None and rango[0] <= asientos <= rango[1]
+            assert dentro == motor._check_asientos(celda, asientos), (celda, asientos)
\ No newline at end of file
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 import datetime
+import io
+import tempfile
 import re
 import os
 import smtplib
@@ -9,15 +11,17 @@ import pytz # LIBRERÍA PARA ZONA HORARIA
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-import requests
 
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from logica_cotizador import SoatQuotator
+from logica_cotizador import SoatQuotator, RUTA_SNAPSHOT
+from cotizacion_flota import leer_en_bloques, cotizar_flota, escribir
+from historial import EscritorHistorial
+from clientes_externos import ClienteSheets, ClienteZoho, ErrorZoho, URL_AUTH_ZOHO, URL_CRM_ZOHO
 
 # 👇 AQUÍ ESTÁ LA MAGIA: Importamos ambas funciones desde generador_pdf
-from generador_pdf import crear_pdf, exportar_pdf_a_png 
+from generador_pdf import crear_pdf_cacheado, exportar_pdf_a_imagen, huella, FORMATOS_IMAGEN
 
 # ... (El resto de tu código, como def mostrar_panel_administrador():) ...
 def aplicar_estilos_css():
@@ -117,7 +121,9 @@ def mostrar_panel_administrador():
                     # Usamos ExcelWriter en modo 'a' (append/añadir) y 'replace' (reemplazar solo esta hoja)
                     with pd.ExcelWriter(ruta_archivo, engine='openpyxl', mode='a', if_sheet_exists='replace') as writer:
                         df_editado.to_excel(writer, sheet_name=hoja_seleccionada, index=False)
-                        
+
+                    # El motor recarga en segundo plano solo este archivo; las cotizaciones siguen sin cortes
+                    iniciar_motor().recargar(en_segundo_plano=True)
                     st.success(f"✅ ¡La hoja '{hoja_seleccionada}' de {aseguradora.capitalize()} se actualizó de forma segura!")
                 except Exception as e:
                     st.error(f"Error crítico al intentar guardar el archivo: {e}")
@@ -128,6 +134,45 @@ def mostrar_panel_administrador():
         st.error(f"No se encontró el archivo en: {ruta_archivo}")
 
 
+def mostrar_cotizacion_flota(motor):
+    """Carga de flotas (CSV / Excel): cotiza por bloques, muestra las primeras filas apenas están
+    listas y deja el resultado para descargar."""
+    st.caption("Columnas: placa (opcional), departamento, uso, clase, asientos, marca y modelo.")
+    archivo = st.file_uploader("Sube el archivo de la flota", type=["csv", "xlsx"], key="archivo_flota")
+    formato = st.radio("Formato del resultado", ["Excel", "CSV"], horizontal=True, key="formato_flota")
+
+    if archivo is not None and st.button("🚚 COTIZAR FLOTA", use_container_width=True):
+        vista = st.empty()
+        avance = st.empty()
+
+        def con_avance(resultados):
+            total = 0
+            for i, bloque in enumerate(resultados):
+                total += len(bloque)
+                if i == 0: vista.dataframe(bloque.head(20), use_container_width=True, hide_index=True)
+                avance.info(f"⏳ {total} vehículos cotizados...")
+                yield bloque
+
+        try:
+            resultados = con_avance(cotizar_flota(motor, leer_en_bloques(archivo, nombre=archivo.name)))
+            base = os.path.splitext(archivo.name)[0]
+            if formato == "Excel":
+                salida = io.BytesIO()
+                total = escribir(resultados, salida, "flota.xlsx")
+                datos, nombre, mime = salida.getvalue(), f"{base}_cotizado.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            else:
+                salida = io.StringIO()
+                total = escribir(resultados, salida, "flota.csv")
+                datos, nombre, mime = salida.getvalue().encode('utf-8-sig'), f"{base}_cotizado.csv", "text/csv"
+            st.session_state.flota = (datos, nombre, mime)
+            avance.success(f"✅ {total} vehículos cotizados")
+        except Exception as e:
+            avance.error(f"No se pudo cotizar el archivo: {e}")
+
+    if st.session_state.get('flota'):
+        datos, nombre, mime = st.session_state.flota
+        st.download_button("💾 Descargar cotización de la flota", datos, nombre, mime, use_container_width=True)
+
 
 # --- 📧 CONFIGURACIÓN DE CORREO ZOHO ---
 SMTP_SERVER = "smtppro.zoho.com"
@@ -145,32 +190,21 @@ except FileNotFoundError:
     st.warning("⚠️ Falta configurar el secreto del correo.")
 
 # --- ☁️ CONEXIÓN A GOOGLE SHEETS ---
-def conectar_google_sheets():
+@st.cache_resource
+def cliente_sheets():
+    # Un solo cliente por proceso: la hoja queda abierta entre cotizaciones
+    return ClienteSheets(dict(st.secrets["gcp_service_account"]), "historial_soat", gspread.service_account_from_dict)
+
+def conectar_google_sheets(renovar=False):
     try:
         if "gcp_service_account" in st.secrets:
-            gc = gspread.service_account_from_dict(st.secrets["gcp_service_account"])
-            sh = gc.open("historial_soat") 
-            worksheet = sh.sheet1
-            return worksheet
+            return cliente_sheets().hoja(renovar)
         else:
             return None
     except Exception as e:
         print(f"Error conectando a Google Sheets: {e}")
         return None
 
-def guardar_historial_google(fecha, hora, cot_id, rol, cliente, dni, celular, email, placa, marca, modelo, uso, precio_ref, cia_min, precio_min, es_campana):
-    """Guarda en la nube con DATOS DE COMPETENCIA."""
-    worksheet = conectar_google_sheets()
-    if worksheet:
-        try:
-            worksheet.append_row([
-                fecha, hora, cot_id, rol, cliente, dni, celular, email, 
-                placa, marca, modelo, uso, precio_ref, cia_min, precio_min, es_campana
-            ])
-            print("✅ Guardado en Google Sheets")
-        except Exception as e:
-            print(f"❌ Error escribiendo en Google Sheets: {e}")
-
 def descargar_historial_google():
     worksheet = conectar_google_sheets()
     if worksheet:
@@ -178,25 +212,16 @@ def descargar_historial_google():
             data = worksheet.get_all_records()
             return pd.DataFrame(data)
         except Exception as e:
+            cliente_sheets().invalidar()
             st.error(f"Error leyendo Google Sheets: {e}")
             return pd.DataFrame()
     return pd.DataFrame()
 
-def guardar_historial_local(fecha, hora, cot_id, rol, cliente, dni, celular, email, placa, marca, modelo, uso, precio_ref, cia_min, precio_min, es_campana):
-    """Guarda en CSV local con DATOS DE COMPETENCIA."""
-    archivo_csv = "historial_cotizaciones.csv"
-    data = {
-        "Fecha": [fecha], "Hora": [hora], "ID": [cot_id], "Rol": [rol],
-        "Cliente": [cliente], "DNI_RUC": [dni], "Celular": [celular], "Email": [email],
-        "Placa": [placa], "Marca": [marca], "Modelo": [modelo], "Uso": [uso], 
-        "Precio_Ref": [precio_ref], "Cia_Min": [cia_min], "Precio_Min": [precio_min], "Es_Campaña": [es_campana]
-    }
-    df_new = pd.DataFrame(data)
-    
-    if not os.path.exists(archivo_csv):
-        df_new.to_csv(archivo_csv, index=False, encoding='utf-8-sig')
-    else:
-        df_new.to_csv(archivo_csv, mode='a', header=False, index=False, encoding='utf-8-sig')
+@st.cache_resource
+def cliente_zoho():
+    # Guarda el access token hasta que vence y reutiliza la conexión HTTP
+    return ClienteZoho(st.secrets["ZOHO_REFRESH_TOKEN"], st.secrets["ZOHO_CLIENT_ID"], st.secrets["ZOHO_CLIENT_SECRET"],
+                       url_auth=st.secrets.get("ZOHO_URL_AUTH", URL_AUTH_ZOHO), url_crm=st.secrets.get("ZOHO_URL_CRM", URL_CRM_ZOHO))
 
 def enviar_notificacion(cot_id, fecha_hora, rol, cliente, celular, placa, marca, modelo, precio_min, cia_min, dni=""):
     try:
@@ -205,45 +230,20 @@ def enviar_notificacion(cot_id, fecha_hora, rol, cliente, celular, placa, marca,
             st.error("❌ Error de configuración: Falta 'ZOHO_REFRESH_TOKEN' en los secretos de Streamlit.")
             return False, "Error de configuración de secretos."
 
-        url_auth = "https://accounts.zoho.com/oauth/v2/token"
-        datos_auth = {
-            "refresh_token": st.secrets["ZOHO_REFRESH_TOKEN"],
-            "client_id": st.secrets["ZOHO_CLIENT_ID"],
-            "client_secret": st.secrets["ZOHO_CLIENT_SECRET"],
-            "grant_type": "refresh_token"
-        }
-        res_auth = requests.post(url_auth, data=datos_auth)
-        res_json = res_auth.json()
-        
-        access_token = res_json.get("access_token")
-        
-        if not access_token:
-            # Mostramos el error exacto que devuelve Zoho en la autenticación
-            st.error(f"❌ Error de autenticación Zoho: {res_json}")
-            raise Exception(f"Auth failed: {res_json}")
-
-        url_crm = "https://www.zohoapis.com/crm/v2/Leads"
-        headers = {"Authorization": f"Zoho-oauthtoken {access_token}"}
-        
-        payload = {
-            "data": [
-                {
-                    "Last_Name": cliente,
-                    "Mobile": str(celular),
-                    "Lead_Source": "Cotizador SOAT Web",
-                    "Description": f"ID Cotización: {cot_id} | Fecha: {fecha_hora} | Rol: {rol} | DNI: {dni} | Vehículo: {marca} {modelo} ({placa}) | Mejor Oferta: S/ {precio_min} ({cia_min})"
-                }
-            ]
+        lead = {
+            "Last_Name": cliente,
+            "Mobile": str(celular),
+            "Lead_Source": "Cotizador SOAT Web",
+            "Description": f"ID Cotización: {cot_id} | Fecha: {fecha_hora} | Rol: {rol} | DNI: {dni} | Vehículo: {marca} {modelo} ({placa}) | Mejor Oferta: S/ {precio_min} ({cia_min})"
         }
         
-        res_crm = requests.post(url_crm, headers=headers, json=payload)
-        
-        if res_crm.status_code in [200, 201]:
+        try:
+            cliente_zoho().crear_lead(lead)
             return True, "¡Cotización generada y enviada a un asesor exitosamente!"
-        else:
-            # Mostramos el error exacto que devuelve el CRM
-            st.error(f"❌ Error de respuesta CRM (Código {res_crm.status_code}): {res_crm.text}")
-            raise Exception(f"CRM API error: {res_crm.text}")
+        except ErrorZoho as e:
+            # Mostramos el error exacto que devuelve Zoho (autenticación o CRM)
+            st.error(f"❌ Error de Zoho: {e}")
+            raise
 
     except Exception as e:
         print(f"⚠️ Excepción general capturada: {e}")
@@ -287,11 +287,20 @@ st.set_page_config(page_title="Cotizador SOAT Digital", layout="centered", page_
 @st.cache_resource
 def iniciar_motor():
     motor = SoatQuotator()
-    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx')
+    motor.cargar_datos('rimac.xlsx', 'positiva.xlsx', 'pacifico.xlsx', 'protecta.xlsx', 'mapfre.xlsx', ruta_snapshot=RUTA_SNAPSHOT)
+    # Quedan guardados en el motor hasta la próxima recarga de tarifas
     motor.obtener_catalogo_vehiculos()
     motor.obtener_clases_vehiculo()
     return motor
 
+@st.cache_resource
+def iniciar_historial():
+    # CSV local siempre; Google Sheets solo si hay credenciales. Se escribe en segundo plano.
+    try: con_sheets = "gcp_service_account" in st.secrets
+    except FileNotFoundError: con_sheets = False
+    # El escritor solo pide la hoja al arrancar o después de un error: ahí conviene reabrirla
+    return EscritorHistorial(obtener_hoja=(lambda: conectar_google_sheets(renovar=True)) if con_sheets else None)
+
 try:
     app = iniciar_motor()
     catalogo = app.obtener_catalogo_vehiculos()
@@ -374,7 +383,7 @@ if carga_exitosa:
             modelo_opts = []
         else:
             marca_txt = marca
-            modelo_opts = catalogo.get(marca, [])
+            modelo_opts = list(catalogo.get(marca, ()))
         
         usar_manual = st.checkbox("✍️ Escribir modelo manualmente")
         if usar_manual:
@@ -383,6 +392,13 @@ if carga_exitosa:
             mod = st.selectbox("🚙 Modelo", modelo_opts + ["OTRO MODELO"])
             modelo_txt = st.text_input("Especificar Otro:", "").upper() if mod == "OTRO MODELO" else mod
 
+        # Si escribió a mano algo que no está en el catálogo, sugerimos lo más parecido
+        if carga_exitosa and modelo_txt and modelo_txt not in modelo_opts:
+            en_catalogo = marca_txt in catalogo
+            sugerencias = app.sugerir(modelo_txt if en_catalogo else f"{marca_txt} {modelo_txt}", marca_txt if en_catalogo else None, 3)
+            sugerencias = [f"{s['marca']} {s['modelo']}" for s in sugerencias if s['modelo']]
+            if sugerencias: st.caption(f"¿Quisiste decir: {', '.join(sugerencias)}?")
+
     st.markdown("---")
 
     # --- 3. CODIGO ADMIN ---
@@ -403,6 +419,24 @@ if carga_exitosa:
             else:
                 st.warning("No se pudo conectar a Google Sheets o la hoja está vacía.")
 
+        with st.expander("📊 Historial local (resumen y descarga)"):
+            almacen = iniciar_historial().almacen
+            st.caption(f"{almacen.total()} cotizaciones registradas")
+            c_dia, c_cia = st.columns(2)
+            c_dia.dataframe(almacen.cotizaciones_por_dia().tail(30), hide_index=True, use_container_width=True)
+            c_cia.dataframe(almacen.conversion_campana(), hide_index=True, use_container_width=True)
+            segmento = st.selectbox("Agrupar por", ["uso", "departamento", "rol"])
+            st.dataframe(almacen.por_segmento(segmento), hide_index=True, use_container_width=True)
+            if st.button("📥 Preparar CSV del historial local"):
+                # Se escribe por partes a un archivo temporal: la tabla nunca está entera en memoria
+                archivo = tempfile.TemporaryFile("w+b")
+                texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+                almacen.exportar_csv(texto)
+                texto.flush()
+                texto.detach()
+                archivo.seek(0)
+                st.download_button("💾 Clic para guardar CSV", archivo, f"Historial_local_{datetime.datetime.now().strftime('%Y%m%d')}.csv", "text/csv")
+
     if 'res' not in st.session_state: st.session_state.res = None
     if 'id' not in st.session_state: st.session_state.id = None
 
@@ -452,8 +486,7 @@ if carga_exitosa:
                 h_log = now.strftime('%H:%M:%S')
                 f_email = now.strftime('%d/%m/%Y %I:%M %p')
                 
-                guardar_historial_local(f_log, h_log, st.session_state.id, rol_actual, nombre, dni, celular, email, placa, marca_txt, modelo_txt, uso, precio_ref, min_cia, min_precio, min_campana)
-                guardar_historial_google(f_log, h_log, st.session_state.id, rol_actual, nombre, dni, celular, email, placa, marca_txt, modelo_txt, uso, precio_ref, min_cia, min_precio, min_campana)
+                iniciar_historial().registrar([f_log, h_log, st.session_state.id, rol_actual, nombre, dni, celular, email, placa, marca_txt, modelo_txt, uso, precio_ref, min_cia, min_precio, min_campana, depto])
                 
                 if not es_admin:
                     enviar_notificacion(st.session_state.id, f_email, rol_actual, nombre, celular, placa, marca_txt, modelo_txt, min_precio, min_cia)
@@ -540,7 +573,9 @@ if st.session_state.res is not None:
         campanas_list = df_visible[df_visible['Tiene_Campaña'] == True]['Aseguradora'].unique().tolist()
         campanas_txt = ", ".join(campanas_list) if campanas_list else ""
 
-        pdf_bytes = crear_pdf(
+        # Los documentos se arman solo cuando se piden (botón) y quedan guardados para esta cotización
+        # mientras no cambien los datos ni la tabla editada; en los demás reruns no se toca el PDF
+        datos_pdf = dict(
             cotizacion_nro=st.session_state.id,
             cliente=nombre, dni_ruc=dni, celular=celular, email=email,
             placa=placa, marca=marca_txt, modelo=modelo_txt,
@@ -550,8 +585,15 @@ if st.session_state.res is not None:
             observaciones_especiales=obs_pdf,
             campanas_activas_txt=campanas_txt
         )
-        
-    # ... (aquí arriba está tu código de pdf_bytes = crear_pdf(...))
+        clave_docs = (st.session_state.id, huella(*datos_pdf.values()))
+        if st.session_state.get('clave_docs') != clave_docs:
+            st.session_state.clave_docs = clave_docs
+            st.session_state.docs = {}
+        docs = st.session_state.docs
+
+        def obtener_pdf():
+            if "pdf" not in docs: docs["pdf"] = crear_pdf_cacheado(**datos_pdf)
+            return docs["pdf"]
 
         def limpiar_txt(t): return re.sub(r'[^\w\s-]', '', str(t)).strip().replace(' ', '_')
         nombre_base = f"COTISOAT_{limpiar_txt(nombre)}_{limpiar_txt(marca_txt)}_{limpiar_txt(modelo_txt)}_{limpiar_txt(uso)}_{datetime.datetime.now().strftime('%d%m%y_%H%M')}"
@@ -578,36 +620,51 @@ if st.session_state.res is not None:
     </style>
     """, unsafe_allow_html=True)
         # --- NUEVO CÓDIGO DE DESCARGA ---
-        st.success("✅ ¡Cotización calculada y documentos generados con éxito!")
+        st.success("✅ ¡Cotización calculada! Genera el PDF o la imagen para descargarlos.")
         
-        # Convertimos los bytes del PDF directamente a bytes de PNG
-        png_bytes = exportar_pdf_a_png(pdf_bytes)
+        # La imagen sale del PDF (también se guarda: solo se rasteriza una vez por cotización y formato)
+        # Sin JPEG: la cotización es casi todo texto y fondo plano, y un JPEG legible pesa más que el PNG
+        opciones_imagen = {"PNG (alta calidad)": (2, "png"), "PNG liviano (WhatsApp)": (1, "png")}
+        tipo_imagen = st.radio("Formato de imagen", list(opciones_imagen), horizontal=True)
+        zoom_imagen, formato_imagen = opciones_imagen[tipo_imagen]
         
         col1, col2 = st.columns(2)
         
         with col1:
-            st.download_button(
-                label="📄 Descargar PDF", 
-                data=pdf_bytes, 
-                file_name=f"{nombre_base}.pdf", 
-                mime="application/pdf",  
-                use_container_width=True
-            )
+            if "pdf" not in docs and st.button("📄 Generar PDF", use_container_width=True): obtener_pdf()
+            if "pdf" in docs:
+                st.download_button(
+                    label="📄 Descargar PDF", 
+                    data=docs["pdf"], 
+                    file_name=f"{nombre_base}.pdf", 
+                    mime="application/pdf",  
+                    use_container_width=True
+                )
             
         with col2:
+            clave_imagen = (zoom_imagen, formato_imagen)
+            if clave_imagen not in docs and st.button("🖼️ Generar Imagen", use_container_width=True):
+                docs[clave_imagen] = exportar_pdf_a_imagen(obtener_pdf(), zoom_imagen, formato_imagen)
+            png_bytes = docs.get(clave_imagen)
             if png_bytes:
                 st.download_button(
                     label="🖼️ Descargar Imagen", 
                     data=png_bytes, 
-                    file_name=f"{nombre_base}.png", 
-                    mime="image/png", 
+                    file_name=f"{nombre_base}.{formato_imagen}", 
+                    mime=FORMATOS_IMAGEN[formato_imagen], 
                     use_container_width=True
                 )
-            else:
-                st.error("Error al generar PNG")
+            elif clave_imagen in docs:
+                st.error("Error al generar la imagen")
         
     else:
         st.error("No hay precios disponibles.")          
+# --- COTIZACIÓN DE FLOTAS (CSV / EXCEL) ---
+if carga_exitosa:
+    st.markdown("---")
+    with st.expander("🚚 Cotizar flota desde CSV / Excel"):
+        mostrar_cotizacion_flota(app)
+
 # --- PANEL DE ADMINISTRACIÓN (FUERA DEL BOTÓN) ---
 if es_admin:
     st.markdown("---")